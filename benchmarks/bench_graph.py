@@ -0,0 +1,259 @@
+# Benchmarks of graph construction and resolution on synthetic graphs.
+#
+# Run from the repository root:
+#
+#   python -m benchmarks.bench_graph --output results.json
+#   python -m benchmarks.bench_graph --baseline results.json
+#
+# Every scenario reports the time to construct the App, the time of App.run
+# and the peak memory of both, as JSON. With --baseline the results are
+# compared against a previous run, and the exit code is 1 if any scenario
+# got slower than the allowed tolerance.
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Annotated, Callable, Dict, List
+
+from src.dinjections import *
+
+
+def new_class(name: str, requires: Dict[str, object] | None = None) -> type:
+    # builds a class whose constructor requires the given hints
+    def __init__(self, *args):
+        self.args = args
+
+    __init__.__annotations__ = dict(requires or {})
+    return type(name, (), {"__init__": __init__, "__module__": __name__})
+
+
+def new_invoke(requires: Dict[str, object]) -> Callable:
+    def invoke(*args):
+        pass
+
+    invoke.__annotations__ = dict(requires)
+    return invoke
+
+
+def flat(n: int) -> List:
+    classes = [new_class(f"Flat{i}") for i in range(n)]
+    return [
+        Provide(*classes),
+        Invoke(new_invoke({f"a{i}": c for i, c in enumerate(classes)})),
+    ]
+
+
+def chain(depth: int) -> List:
+    classes = [new_class("Chain0")]
+    for i in range(1, depth):
+        classes.append(new_class(f"Chain{i}", {"d": classes[-1]}))
+    return [Provide(*classes), Invoke(new_invoke({"d": classes[-1]}))]
+
+
+def fan(width: int) -> List:
+    # one root required by every middle class, one sink requiring all of them
+    root = new_class("FanRoot")
+    middle = [new_class(f"Fan{i}", {"r": root}) for i in range(width)]
+    sink = new_class("FanSink", {f"m{i}": c for i, c in enumerate(middle)})
+    return [Provide(root, *middle, sink), Invoke(new_invoke({"s": sink}))]
+
+
+def group(size: int) -> List:
+    member = new_class("Member")
+    return [
+        Provide(*[Provider(member, group=True) for _ in range(size)]),
+        Invoke(new_invoke({"g": Annotated[member, Annotations(group=True)]})),
+    ]
+
+
+def modules(count: int, per: int = 4) -> List:
+    # every module provides a few classes requiring the last class of the
+    # previous module, and invokes its own last class
+    mods = []
+    previous = None
+    for m in range(count):
+        classes = []
+        for i in range(per):
+            requires = {"p": previous} if previous is not None else {}
+            previous = new_class(f"Mod{m}_{i}", requires)
+            classes.append(previous)
+        mods.append(Module(Provide(*classes), Invoke(new_invoke({"d": previous}))))
+    return mods
+
+
+def options(count: int) -> List:
+    # one Provide option per class, merged into the same module
+    classes = [new_class(f"Option{i}") for i in range(count)]
+    return [Provide(c) for c in classes] + [Invoke(new_invoke({"d": classes[-1]}))]
+
+
+def key_lookup(n: int) -> Callable[[], None]:
+    classes = [new_class(f"Key{i}") for i in range(n)]
+    provides = Registry({c: c for c in classes})
+
+    def run():
+        for c in classes:
+            key_in(c, provides)
+    return run
+
+
+def hints(n: int) -> Callable[[], None]:
+    # parses new callables every run, so the cache does not hide the cost
+    dependency = new_class("Hinted")
+
+    def run():
+        for i in range(n):
+            def fn(a: Annotated[dependency, Annotations(name="a")], b: dependency) -> dependency:
+                pass
+            get_hints(fn)
+    return run
+
+
+def calls(n: int) -> Callable[[], None]:
+    # resolves the same handler many times, after the first call built it
+    classes = [new_class(f"Call{i}") for i in range(4)]
+    app = App(Provide(*classes))
+
+    def handle(request: str, a: classes[0], b: classes[1], c: classes[2], d: classes[3]):
+        pass
+
+    app.call(handle, request="")
+
+    def run():
+        for _ in range(n):
+            app.call(handle, request="")
+    return run
+
+
+def injects(n: int) -> Callable[[], None]:
+    classes = [new_class(f"Inject{i}") for i in range(4)]
+    app = App(Provide(*classes))
+
+    @app.inject
+    def handle(request: str, a: classes[0], b: classes[1], c: classes[2], d: classes[3]):
+        pass
+
+    handle("")
+
+    def run():
+        for _ in range(n):
+            handle("")
+    return run
+
+
+SCENARIOS = {
+    "flat_10k": lambda scale: flat(10000 // scale),
+    "chain_1k": lambda scale: chain(1000 // scale),
+    "fan_1k": lambda scale: fan(1000 // scale),
+    "group_5k": lambda scale: group(5000 // scale),
+    "modules_500": lambda scale: modules(500 // scale),
+    "options_2k": lambda scale: options(2000 // scale),
+}
+
+MICRO = {
+    "key_in_2k": lambda scale: key_lookup(2000 // scale),
+    "get_hints_1k": lambda scale: hints(1000 // scale),
+    "call_10k": lambda scale: calls(10000 // scale),
+    "inject_10k": lambda scale: injects(10000 // scale),
+}
+
+
+def measure(fn: Callable) -> tuple:
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def peak_memory(fn: Callable) -> int:
+    # traced separately, tracing slows down the timed runs
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_scenario(build: Callable, scale: int, repeat: int) -> dict:
+    construct = run = float("inf")
+    for _ in range(repeat):
+        options = build(scale)
+        app, elapsed = measure(lambda: App(*options))
+        construct = min(construct, elapsed)
+        run = min(run, measure(app.run)[1])
+
+    options = build(scale)
+    return {
+        "construct_s": construct,
+        "run_s": run,
+        "peak_bytes": peak_memory(lambda: App(*options).run()),
+    }
+
+
+def bench_micro(build: Callable, scale: int, repeat: int) -> dict:
+    fn = build(scale)
+    return {"run_s": min(measure(fn)[1] for _ in range(repeat))}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("construct_s", "run_s"):
+            if metric in result and metric in previous:
+                if result[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{name}.{metric}: {previous[metric]:.6f} -> {result[metric]:.6f}"
+                    )
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="dinjections graph benchmarks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=int, default=1, help="divide every graph size by this factor")
+    parser.add_argument("--only", nargs="*", help="names of the scenarios to run")
+    parser.add_argument("--output", help="file to write the JSON results to, defaults to stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, build in SCENARIOS.items():
+        if not args.only or name in args.only:
+            results[name] = bench_scenario(build, args.scale, args.repeat)
+    for name, build in MICRO.items():
+        if not args.only or name in args.only:
+            results[name] = bench_micro(build, args.scale, args.repeat)
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "scale": args.scale,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("regression:", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,2 @@
 from .app import *
+from .async_app import *
@@ -1,16 +1,52 @@
-from typing import List
+import functools
+import inspect
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Collection, Dict, Hashable, List
 
 from .exceptions import *
+from .fork import *
+from .instrument import *
 from .lifecycle import *
 from .module import *
 from .options import *
+from .plan import *
+from .scope import *
+from .validate import *
+
+
+# warmup mode building the remaining dependencies after start
+BACKGROUND = "background"
 
 
 class App:
-    def __init__(self, *args: List[Module | Option]):
+    def __init__(
+        self,
+        *args: List[Module | Option],
+        max_workers: int | None = None,
+        listeners: List[Listener] | None = None,
+        strict: bool = False,
+    ):
+        # when max_workers is set, independent providers are built concurrently
+        self.max_workers = max_workers
+        self.instrument = Instrument(listeners)
         # container and provides are shared between all modules
-        self.container = {}
-        self.provides: Dict[str, ProvideTarget] = {}
+        self.container = Registry()
+        # locks of the keys being built, and of the compiler
+        self.locks: Dict[Hashable, threading.RLock] = {}
+        self.compile_lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        # set once the app is started and, with a background warmup, warm
+        self.ready = threading.Event()
+        # set between start and stop, the hooks appended by dependencies built
+        # on demand are then started once they are built
+        self.started = False
+        self.hook_lock = threading.RLock()
+        self.warmup_thread: threading.Thread | None = None
+        self.warmup_errors: List[Exception] = []
+        self.provides: ProvidesType = Registry()
         # list of modules to be run
         self.modules: List[Module] = []
 
@@ -18,27 +54,518 @@ class App:
         for arg in args:
             if isinstance(arg, Module):
                 arg.register_container(self.container)
-                self.provides.update(arg.get_provides())
+                self.provides.merge(arg.get_provides())
                 self.modules.append(arg)
             elif isinstance(arg, Option):
                 options.append(arg)
 
         self.root = Module(*options)
         self.root.register_container(self.container)
-        self.provides.update(self.root.get_provides())
+        self.provides.merge(self.root.get_provides())
         self.modules.append(self.root)
 
         for module in self.modules:
             module.set_provides(self.provides)
+            module.lifecycle.instrument = self.instrument
+
+        # base classes required without being provided resolve to their only
+        # provided subclass, ambiguous ones are reported here
+        self.supertypes = supertype_index(self.provides)
+        self.check_supertypes()
+
+        # strict apps check the whole graph before compiling it
+        if strict:
+            self.validate()
+        self.compile()
+
+        track_fork(self)
+
+    def check_supertypes(self):
+        targets = [invoke for module in self.modules for invoke in module._invokes]
+        for target in self.provides.values():
+            targets.extend(target if isinstance(target, list) else [target])
+        for target in targets:
+            if not getattr(target, "loaded", True):
+                # provided by dotted path and not imported yet
+                continue
+            for require in target.requires:
+                key = require.name if isinstance(require, Provider) else require
+                if require != Lifecycle and isinstance(key, type):
+                    key_lookup(key, self.provides, self.supertypes)
+
+    def validate(self):
+        # checks every requirement of the app without building anything, and
+        # raises a ValidationError with all the problems found
+        errors = Validator(self.modules, self.provides, self.supertypes).validate()
+        if errors:
+            raise ValidationError(errors)
 
-    def run(self):
+    def compile(self) -> List[InvokeStep]:
+        # sorts the dependencies of every invoke once, so that run only has to
+        # execute the resulting steps in order
+        self.compiler = Compiler(self.provides, self.get, self.stream, self.supertypes)
+        self.plans = Registry()
+        # call plans of the functions passed to call, by function
+        self.calls = weakref.WeakKeyDictionary()
+        self.plan: List[InvokeStep] = []
         for module in self.modules:
             for invoke in module._invokes:
-                inject = module.build_dependencies(invoke)
+                self.plan.append(self.compiler.compile_invoke(invoke, module))
+        return self.plan
+
+    def plan_for(self, key: ProviderKey) -> List[Step]:
+        # steps needed to build a single key, compiled on first use
+        plan = self.plans.get(key)
+        if plan is None:
+            with self.compile_lock:
+                plan = self.plans.get(key)
+                if plan is None:
+                    plan = self.compiler.closure(key, self.root)
+                    self.plans[key] = plan
+        return plan
+
+    def get(self, key: ProviderKey) -> Any:
+        # returns the dependency provided for key, building it if needed
+        container = self.container
+        try:
+            value = container[key]
+        except KeyError:
+            pass
+        else:
+            if self.instrument.listeners:
+                self.instrument.container(key, True)
+            return load(value)
+
+        if self.instrument.listeners:
+            self.instrument.container(key, False)
+        plan = self.plan_for(key)
+        with self.instrument.resolve(None):
+            for step in plan:
+                if step.scope == REQUEST:
+                    raise ScopeError(
+                        f"Request scoped dependency {key_name(step.key)} can only be resolved in a scope"
+                    )
+                if step.key not in container:
+                    self.build_once(step, container)
+        # the last step builds key, or the subclass providing it
+        return load(container[plan[-1].key])
+
+    def build_once(self, step: Step, container: ContainerType, build: Callable = build_step):
+        # builds step into container, unless another thread built it while
+        # this one was waiting for the lock of its key. each key has its own
+        # lock, so unrelated keys are built without waiting for each other
+        with self.key_lock(step.key):
+            if step.key not in container:
+                container[step.key] = self.instrument.timed(build, step, container)
+                if self.started:
+                    self.start_hooks_of(step.key)
+
+    def key_lock(self, key: ProviderKey) -> threading.RLock:
+        # lock held while key is built, created on first use
+        lock = self.locks.get(key_identity(key))
+        if lock is None:
+            lock = self.locks.setdefault(key_identity(key), threading.RLock())
+        return lock
+
+    def stream(self, key: ProviderKey) -> LazyGroup:
+        # returns the group provided for key as a LazyGroup, which builds
+        # each member, and what it requires, when it is first accessed
+        container = self.container
+        try:
+            return container[key]
+        except KeyError:
+            pass
+
+        step = self.plan_for(key)[-1]
+
+        def build(index: int) -> Any:
+            # reads the container of the app when the member is built, which
+            # refresh may have replaced since the group was streamed
+            for slot in step.calls[index][1]:
+                if slot.eager:
+                    self.get(slot.key)
+            member = build_member(step, index, self.container)
+            if self.started:
+                self.start_hooks_of(step.key)
+            return member
+
+        self.build_once(step, container, lambda step, container: LazyGroup(len(step.calls), build))
+        return container[step.key]
+
+    def call(self, fn: Callable, /, **extra: Any) -> Any:
+        # calls fn with its dependencies, extra arguments are passed as they
+        # are. the arguments of fn are resolved on the first call only, the
+        # ones passed by that call are not resolved until a call leaves them out
+        plan = self.calls.get(getattr(fn, "__func__", fn))
+        if plan is None or not plan.covers(extra):
+            plan = self.call_plan(fn, extra)
+        return self.call_with_plan(plan, fn, extra)
+
+    def inject(self, fn: Callable) -> Callable:
+        # decorator calling fn with its dependencies, arguments given to the
+        # decorated function are used instead of the provided ones
+        plan = self.call_plan(fn)
+
+        @functools.wraps(fn)
+        def injected(*args: Any, **kwargs: Any) -> Any:
+            if args:
+                kwargs.update(zip(plan.params, args))
+            return self.call_with_plan(plan, fn, kwargs)
+
+        return injected
+
+    def call_with_plan(self, plan: CallPlan, fn: Callable, extra: Dict[str, Any]) -> Any:
+        try:
+            kwargs = plan.args(self.container, extra)
+        except KeyError:
+            # dependencies are built on the first call, or again after a fork
+            for key in plan.keys:
+                self.get(key)
+            kwargs = plan.args(self.container, extra)
+        if not plan.pooled:
+            return fn(**kwargs)
+
+        checked = []
+        try:
+            for name in plan.pooled:
+                pool = kwargs[name]
+                if type(pool) is Pool:
+                    kwargs[name] = pool.acquire()
+                    checked.append((pool, kwargs[name]))
+            return fn(**kwargs)
+        finally:
+            for pool, instance in checked:
+                pool.release(instance)
+
+    def call_plan(self, fn: Callable, supplied: Collection[str] = ()) -> CallPlan:
+        # arguments in supplied, and the ones whose hint is not a key, are
+        # left to the caller
+        target = getattr(fn, "__func__", fn)
+        plan = self.calls.get(target)
+        if plan is not None and plan.covers(supplied):
+            return plan
+
+        hints = get_hints(fn)
+        names = [name for name in hints if name != "return"]
+        slots = []
+        extra = []
+        pooled = []
+        skipped = []
+        for name, require in zip(names, get_requires_from_hints(hints)):
+            key = require.name if isinstance(require, Provider) else require
+            if name in supplied or not isinstance(key, (str, type)):
+                extra.append((name, key))
+                if name in supplied:
+                    skipped.append(name)
+                continue
+            if require != Lifecycle and self.compiler.lookup(key)[1] is None:
+                if not (isinstance(require, Provider) and require.optional):
+                    extra.append((name, key))
+                    continue
+            slot = self.compiler.slots(InvokeTarget(fn, [require]))[0]
+            if slot.eager:
+                if self.plan_for(slot.key)[-1].pool is not None:
+                    pooled.append(name)
+            slots.append((name, slot))
+
+        plan = CallPlan(
+            list(inspect.signature(fn).parameters), slots, extra, self.root.lifecycle, pooled, skipped
+        )
+        try:
+            self.calls[target] = plan
+        except TypeError:
+            # cannot be weakly referenced, resolved again on every call
+            pass
+        return plan
+
+    def derive(self, *args: Module | Option) -> "App":
+        # returns a new app providing the same dependencies as this one, with
+        # the ones in args provided instead. dependencies already built here
+        # are shared with it, unless they depend on one of those overrides.
+        # invokes of this app are not run again by the derived app. a key
+        # provided in args replaces the provider of this app, groups included.
+        # overrides are read before the derived app replaces the provides of
+        # the modules in args with its own
+        overrides = Module(*[arg for arg in args if isinstance(arg, Option)]).get_provides()
+        base = Module()
+        base.add_provides(Registry(
+            (key, target) for key, target in self.provides.items() if key not in overrides
+        ))
+        derived = type(self)(
+            base,
+            *args,
+            max_workers=self.max_workers,
+            listeners=list(self.instrument.listeners),
+        )
+
+        affected = {key_identity(key) for key in self.compiler.dependents(list(overrides))}
+        for key, value in list(self.container.items()):
+            if key_identity(key) not in affected:
+                derived.container[key] = value
+        return derived
+
+    def scope(self, values: ContainerType | None = None) -> Scope:
+        # returns a child container for request scoped dependencies, values
+        # are used instead of building the providers of their keys
+        return Scope(self, values)
+
+    def run(
+        self,
+        wait: bool = False,
+        timeout: float | None = None,
+        hook_timeout: float | None = None,
+        warmup: str | None = None,
+    ):
+        # starts the app and stops it again, after SIGINT or SIGTERM is
+        # received when wait is set
+        self.start(warmup=warmup)
+        try:
+            if wait:
+                wait_for_signal()
+        finally:
+            self.stop(timeout=timeout, hook_timeout=hook_timeout)
+
+    def start(self, warmup: str | None = None):
+        # runs the invokes, building what they need, and then the start hooks.
+        # with warmup="background" every other dependency is then built on a
+        # background thread, and ready is set once they are all built
+        if warmup not in (None, BACKGROUND):
+            raise PyDITypeError(f"Warmup must be None or {BACKGROUND!r}, got {warmup!r}")
+        if self.max_workers is None:
+            self.run_plan()
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                self.run_plan(executor)
+        self.start_hooks()
+        self.started = True
+
+        if warmup is None:
+            self.ready.set()
+            return
+        self.warmup_cancel = threading.Event()
+        self.warmup_thread = threading.Thread(
+            target=self.warm, args=(self.warmup_cancel,), name="dinjections warmup", daemon=True
+        )
+        self.warmup_thread.start()
+
+    def warm(self, cancel: threading.Event):
+        # builds the singletons that are not built yet, and the members of the
+        # streamed groups, one at a time so that requests resolving them
+        # concurrently wait as little as possible, and starts the hooks they
+        # append. errors are kept in warmup_errors
+        for key, target in list(self.provides.items()):
+            targets = target if isinstance(target, list) else [target]
+            if any(t.scope != SINGLETON for t in targets):
+                continue
+            value = self.container.get(key)
+            if type(value) is LazyGroup:
+                builds = [functools.partial(value.__getitem__, index) for index in range(len(value))]
+            elif key not in self.container:
+                builds = [functools.partial(self.get, key)]
+            else:
+                continue
+            for build in builds:
+                if cancel.is_set():
+                    return
+                try:
+                    build()
+                except Exception as e:
+                    self.warmup_errors.append(e)
+                # lets other threads run between dependencies
+                time.sleep(0)
+
+        with self.hook_lock:
+            for hook in self.hooks():
+                if hook.started or cancel.is_set():
+                    continue
+                try:
+                    if callable(hook.on_start):
+                        call_hook(hook, "start", self.instrument)
+                    hook.started = True
+                except Exception as e:
+                    self.warmup_errors.append(e)
+        self.ready.set()
+
+    def stop(self, timeout: float | None = None, hook_timeout: float | None = None):
+        # runs the stop hooks of the started hooks, in reverse dependency order.
+        # hooks of the same layer stop concurrently, within hook_timeout each
+        # and timeout overall
+        if self.warmup_thread is not None:
+            self.warmup_cancel.set()
+            self.warmup_thread.join()
+            self.warmup_thread = None
+        with self.hook_lock:
+            self.started = False
+        stop_hooks(self.started_hooks(), self.instrument, timeout, hook_timeout)
+
+    def hooks(self) -> List[Hook]:
+        # hooks of every module, in order of registration
+        hooks = [hook for module in self.modules for hook in module.lifecycle.hooks]
+        return sorted(hooks, key=lambda hook: hook.sequence)
+
+    def started_hooks(self) -> List[Hook]:
+        return [hook for hook in self.hooks() if hook.started]
+
+    def start_hooks(self):
+        for hook in self.hooks():
+            if hook.started:
+                continue
+            try:
+                if callable(hook.on_start):
+                    call_hook(hook, "start", self.instrument)
+            except BaseException:
+                try:
+                    self.stop()
+                except LifecycleError:
+                    pass
+                raise
+            hook.started = True
+
+    def start_hooks_of(self, key: ProviderKey):
+        # starts the pending hooks appended while key was built, after start
+        with self.hook_lock:
+            if not self.started:
+                return
+            for hook in self.hooks_of({key_identity(key)}):
+                if hook.started:
+                    continue
+                if callable(hook.on_start):
+                    call_hook(hook, "start", self.instrument)
+                hook.started = True
+
+    def run_plan(self, executor: ThreadPoolExecutor | None = None):
+        container = self.container
+        instrument = self.instrument
+        for invoke in self.plan:
+            if invoke.error is not None:
+                raise invoke.error
+            with instrument.resolve(invoke_name(invoke)):
+                if instrument.listeners:
+                    instrument.invoke(invoke, container)
+                self.build_steps(invoke.steps, container, executor)
+                token = building.set((None, invoke.layer))
                 try:
-                    invoke.callable(*inject)
-                except TypeError as e:
-                    if "missing" in str(e):
-                        raise MissingHintError(str(e), "verify if all hints are set")
-                    raise e
-                module.lifecycle.start()
+                    call_target(
+                        invoke.target.callable,
+                        build_args(invoke.slots, invoke.module.lifecycle, container),
+                    )
+                finally:
+                    building.reset(token)
+
+    def build_steps(
+        self,
+        steps: List[Step],
+        container: ContainerType,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        if executor is not None:
+            report = self.instrument.built if self.instrument.listeners else None
+            return build_steps_parallel(steps, container, executor, report, self.key_lock)
+        for step in steps:
+            if step.key not in container:
+                self.build_once(step, container)
+
+    def fork_unsafe(self) -> List[ProviderKey]:
+        # keys with at least one provider that is not fork safe
+        keys = []
+        for key, target in self.provides.items():
+            targets = target if isinstance(target, list) else [target]
+            if not all(t.fork_safe for t in targets):
+                keys.append(key)
+        return keys
+
+    def after_fork(self):
+        # runs in the child after a fork: drops the dependencies that are not
+        # fork safe and everything built from them, so they are built again
+        # when they are next resolved. their hooks belong to the parent
+        # locks may have been held by threads that do not exist in the child
+        self.locks = {}
+        self.compile_lock = threading.RLock()
+        self.refresh_lock = threading.Lock()
+        self.hook_lock = threading.RLock()
+        for value in self.container.values():
+            if type(value) in (Factory, Pool):
+                value.after_fork()
+        dropped = self.compiler.dependents(self.fork_unsafe())
+        for key in dropped:
+            self.container.pop(key, None)
+
+        identities = {key_identity(key) for key in dropped}
+        self.remove_hooks(self.hooks_of(identities))
+
+    def refresh(self, key: ProviderKey):
+        # builds key again, with every built dependency that requires it, into
+        # a copy of the container. the hooks of the new dependencies are
+        # started, the copy replaces the container, and the hooks of the
+        # replaced dependencies are stopped. scopes opened before keep reading
+        # the previous container
+        key = self.compiler.lookup(key)[0]
+        with self.refresh_lock:
+            old = self.container
+            affected = [k for k in self.compiler.dependents([key]) if k in old]
+            identities = {key_identity(k) for k in affected}
+            container = Registry(
+                (k, v) for k, v in old.items() if key_identity(k) not in identities
+            )
+            previous = self.hooks()
+            known = set(map(id, previous))
+            added = []
+            try:
+                steps = sorted((self.compiler.steps[k] for k in affected), key=lambda step: step.layer)
+                for step in steps:
+                    container[step.key] = build_step(step, container)
+                added = [hook for hook in self.hooks() if id(hook) not in known]
+                for hook in added:
+                    if callable(hook.on_start):
+                        call_hook(hook, "start", self.instrument)
+                    hook.started = True
+            except BaseException:
+                # the container is left as it was
+                added = [hook for hook in self.hooks() if id(hook) not in known]
+                self.remove_hooks(added)
+                try:
+                    stop_hooks([hook for hook in added if hook.started], self.instrument)
+                except LifecycleError:
+                    pass
+                raise
+
+            for k, value in container.items():
+                if type(value) is Factory and key_identity(k) not in identities:
+                    container[k] = Factory(value.step, container, value.lifecycle)
+            self.container = container
+            for module in self.modules:
+                module.register_container(container)
+
+            replaced = [hook for hook in self.hooks_of(identities) if id(hook) in known]
+            self.remove_hooks(replaced)
+            stop_hooks([hook for hook in replaced if hook.started], self.instrument)
+
+    def hooks_of(self, identities: set) -> List[Hook]:
+        # hooks appended by the providers of the given key identities
+        return [
+            hook for hook in self.hooks()
+            if hook.key is not None and key_identity(hook.key) in identities
+        ]
+
+    def remove_hooks(self, hooks: List[Hook]):
+        removed = set(map(id, hooks))
+        for module in self.modules:
+            module.lifecycle.hooks = [hook for hook in module.lifecycle.hooks if id(hook) not in removed]
+
+    def pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        # returns the stats of every pool built so far, by key name
+        return {
+            key_name(key): value.stats()
+            for key, value in self.container.items()
+            if type(value) is Pool
+        }
+
+    def add_listener(self, listener: Listener):
+        self.instrument.listeners.append(listener)
+
+    def stats(self) -> Dict[str, Any] | None:
+        # returns the stats of the first Recorder listener, if there is one
+        for listener in self.instrument.listeners:
+            if isinstance(listener, Recorder):
+                return listener.stats()
+        return None
@@ -0,0 +1,251 @@
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, List
+
+from .app import *
+from .plan import *
+
+
+class AsyncApp(App):
+    # This is an App whose providers, invokes and hooks may be coroutine
+    # functions. Independent providers and hooks are awaited concurrently.
+    # get and call cannot await, coroutine providers they would build are
+    # resolved with get_async instead
+    # task of the background warmup, set by start
+    warmup_task: asyncio.Task | None = None
+    async_lock: asyncio.Lock | None = None
+
+    def compile(self) -> List[InvokeStep]:
+        self.check_coroutines()
+        return super().compile()
+
+    def check_coroutines(self):
+        # coroutine providers are only awaited by start and get_async, the
+        # ones that would be built by a lazy proxy, a scope or a factory are
+        # rejected
+        targets = [invoke for module in self.modules for invoke in module._invokes]
+        for key, target in self.provides.items():
+            for t in target if isinstance(target, list) else [target]:
+                targets.append(t)
+                if not is_coroutine(t.callable):
+                    continue
+                if t.lazy or t.scope != SINGLETON or t.pool is not None:
+                    raise PyDITypeError(
+                        f"Coroutine provider of {key_name(key)} must be a singleton that is not lazy or pooled"
+                    )
+        for target in targets:
+            if not getattr(target, "loaded", True):
+                continue
+            for require in target.requires:
+                if not (isinstance(require, Provider) and require.lazy):
+                    continue
+                _, provided = key_lookup(require.name, self.provides, self.supertypes)
+                provided = provided if isinstance(provided, list) else [provided]
+                if any(t is not None and is_coroutine(t.callable) for t in provided):
+                    raise PyDITypeError(
+                        f"{key_name(require.name)} has a coroutine provider and cannot be required lazily"
+                    )
+
+    def build_once(self, step: Step, container: ContainerType, build: Callable = build_step):
+        for callable, _ in step.calls:
+            if is_coroutine(callable):
+                raise PyDITypeError(
+                    f"{key_name(step.key)} has a coroutine provider, resolve it with get_async"
+                )
+        super().build_once(step, container, build)
+
+    def start_hooks_of(self, key: ProviderKey):
+        # hooks of dependencies built by get or call are started synchronously
+        for hook in self.hooks_of({key_identity(key)}):
+            if not hook.started and inspect.iscoroutinefunction(hook.on_start):
+                raise PyDITypeError(
+                    f"{key_name(key)} appends a coroutine start hook, resolve it with get_async"
+                )
+        super().start_hooks_of(key)
+
+    async def get_async(self, key: ProviderKey) -> Any:
+        # same as get, awaiting coroutine providers. the hooks appended by the
+        # dependencies it builds after start are started before it returns
+        container = self.container
+        try:
+            value = container[key]
+        except KeyError:
+            pass
+        else:
+            if self.instrument.listeners:
+                self.instrument.container(key, True)
+            return load(value)
+
+        if self.instrument.listeners:
+            self.instrument.container(key, False)
+        plan = self.plan_for(key)
+        for step in plan:
+            if step.scope == REQUEST:
+                raise ScopeError(
+                    f"Request scoped dependency {key_name(step.key)} can only be resolved in a scope"
+                )
+        if self.async_lock is None:
+            self.async_lock = asyncio.Lock()
+        async with self.async_lock:
+            built = {key_identity(step.key) for step in plan if step.key not in container}
+            with self.instrument.resolve(None):
+                await build_steps_async(plan, container, self.instrument)
+            if self.started and built:
+                await start_hooks_async(
+                    [hook for hook in self.hooks_of(built) if not hook.started], self.instrument
+                )
+        return load(container[plan[-1].key])
+
+    async def run(
+        self,
+        wait: bool = False,
+        timeout: float | None = None,
+        hook_timeout: float | None = None,
+        warmup: str | None = None,
+    ):
+        await self.start(warmup=warmup)
+        try:
+            if wait:
+                await wait_for_signal_async()
+        finally:
+            await self.stop(timeout=timeout, hook_timeout=hook_timeout)
+
+    async def start(self, warmup: str | None = None):
+        # same as App.start, the background warmup is a task of the running
+        # event loop instead of a thread
+        if warmup not in (None, BACKGROUND):
+            raise PyDITypeError(f"Warmup must be None or {BACKGROUND!r}, got {warmup!r}")
+        container = self.container
+        instrument = self.instrument
+        for invoke in self.plan:
+            if invoke.error is not None:
+                raise invoke.error
+            with instrument.resolve(invoke_name(invoke)):
+                if instrument.listeners:
+                    instrument.invoke(invoke, container)
+                await build_steps_async(invoke.steps, container, instrument)
+                token = building.set((None, invoke.layer))
+                try:
+                    await call_target_async(
+                        invoke.target.callable,
+                        build_args(invoke.slots, invoke.module.lifecycle, container),
+                    )
+                finally:
+                    building.reset(token)
+        await start_hooks_async(
+            [hook for hook in self.hooks() if not hook.started], self.instrument
+        )
+
+        self.started = True
+        if warmup is None:
+            self.ready.set()
+            return
+        self.warmup_task = asyncio.ensure_future(self.warm_async())
+
+    async def warm_async(self):
+        # builds the singletons that are not built yet, and the members of the
+        # streamed groups, and starts the hooks they append. errors are kept
+        # in warmup_errors
+        for key, target in list(self.provides.items()):
+            targets = target if isinstance(target, list) else [target]
+            if any(t.scope != SINGLETON for t in targets):
+                continue
+            value = self.container.get(key)
+            if type(value) is LazyGroup:
+                # members of lazy groups are never coroutine providers
+                for index in range(len(value)):
+                    try:
+                        value[index]
+                    except Exception as e:
+                        self.warmup_errors.append(e)
+                    await asyncio.sleep(0)
+            elif key not in self.container:
+                try:
+                    await self.get_async(key)
+                except Exception as e:
+                    self.warmup_errors.append(e)
+
+        for hook in self.hooks():
+            if hook.started:
+                continue
+            try:
+                await call_hook_async(hook, "start", self.instrument)
+                hook.started = True
+            except Exception as e:
+                self.warmup_errors.append(e)
+        self.ready.set()
+
+    async def stop(self, timeout: float | None = None, hook_timeout: float | None = None):
+        if self.warmup_task is not None:
+            self.warmup_task.cancel()
+            try:
+                await self.warmup_task
+            except asyncio.CancelledError:
+                pass
+            self.warmup_task = None
+        self.started = False
+        await stop_hooks_async(self.started_hooks(), self.instrument, timeout, hook_timeout)
+
+
+def is_coroutine(callable: Callable) -> bool:
+    # providers given by dotted path are only checked once imported
+    if isinstance(callable, DeferredImport):
+        if callable.target is None:
+            return False
+        callable = callable.target
+    return inspect.iscoroutinefunction(callable)
+
+
+async def call_target_async(callable: Callable, args: List[Any]) -> Any:
+    result = call_target(callable, args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def build_step_async(step: Step, container: ContainerType) -> ConternerTargetType:
+    if step.scope in (TRANSIENT, WEAK) or step.pool is not None:
+        # built synchronously when they are read, their providers are not
+        # coroutine functions
+        return build_step(step, container)
+    token = building.set((step.key, step.layer))
+    try:
+        elements = await asyncio.gather(*(
+            call_target_async(callable, build_args(slots, step.module.lifecycle, container))
+            for callable, slots in step.calls
+        ))
+    finally:
+        building.reset(token)
+    if step.group:
+        return list(elements)
+    return elements[0]
+
+
+async def build_steps_async(
+    steps: List[Step], container: ContainerType, instrument: Instrument | None = None
+):
+    # every step becomes a task that waits for the tasks of its requirements,
+    # steps are in dependency order so those tasks always exist already
+    tasks = {}
+
+    async def build(step: Step):
+        requires = [tasks[i] for i in map(key_identity, step.requires) if i in tasks]
+        if requires:
+            await asyncio.gather(*requires)
+        if instrument is None or not instrument.listeners:
+            container[step.key] = await build_step_async(step, container)
+            return
+        start = time.perf_counter()
+        container[step.key] = await build_step_async(step, container)
+        instrument.built(step, time.perf_counter() - start)
+
+    for step in steps:
+        if step.key not in container:
+            tasks[key_identity(step.key)] = asyncio.ensure_future(build(step))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
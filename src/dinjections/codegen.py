@@ -0,0 +1,171 @@
+# Generates a Python module that builds the dependencies of an App with plain
+# function calls, in dependency order, without reading any hint at runtime.
+#
+#   python -m dinjections.codegen myapp.container:app --output myapp/wired.py
+#   python -m dinjections.codegen myapp.container:app --output myapp/wired.py --check
+#
+# The source is the dotted path of an App, or of a function returning one. The
+# generated module has a build function returning the built dependencies by
+# key, and the Lifecycle the hooks were appended to. With --check nothing is
+# written, and the exit code is 1 if the output is missing or out of date.
+import argparse
+import sys
+from typing import Any, Dict, List
+
+from .app import *
+from .options import *
+
+
+# name of this module, also when it is run as __main__
+COMMAND = Lifecycle.__module__.rpartition(".")[0] + ".codegen"
+
+
+class Generator:
+    # This is a class that writes the compiled plan of an app as code. Every
+    # provider, invoke and class key is imported once, under an alias.
+    def __init__(self, app: App, source: str, output: str | None = None):
+        self.app = app
+        self.source = source
+        # file the module is written to, named in the command of the header
+        self.output = output
+        self.imports: Dict[tuple, str] = {}
+        self.import_lines: List[str] = []
+        self.lines: List[str] = []
+        # variable holding each built key, by key identity
+        self.variables: Dict[Any, str] = {}
+        self.keys: List[ProviderKey] = []
+
+    def generate(self) -> str:
+        for invoke in self.app.plan:
+            if invoke.error is not None:
+                raise invoke.error
+            for step in invoke.steps:
+                self.step(step)
+            self.lines.append(f"    {self.call(invoke.target.callable, invoke.slots)}")
+
+        returned = ", ".join(f"{self.key(key)}: {self.variables[key_identity(key)]}" for key in self.keys)
+        command = f"python -m {COMMAND} {self.source}"
+        if self.output:
+            command += f" --output {self.output}"
+        header = [
+            f"# Generated by {COMMAND} from {self.source}, do not edit.",
+            f"# Run {command} to generate it again.",
+            f"from {Lifecycle.__module__} import Lifecycle",
+        ]
+        body = [
+            "",
+            "",
+            "def build(lifecycle=None):",
+            "    # returns the dependencies built by the app, by key, and the lifecycle",
+            "    # their hooks were appended to",
+            "    lifecycle = Lifecycle() if lifecycle is None else lifecycle",
+            *self.lines,
+            f"    return {{{returned}}}, lifecycle",
+        ]
+        return "\n".join(header + self.import_lines + body) + "\n"
+
+    def step(self, step: Step):
+        identity = key_identity(step.key)
+        if identity in self.variables:
+            return
+        if step.scope != SINGLETON or step.pool is not None:
+            raise PyDITypeError(
+                f"Cannot generate code for {key_name(step.key)}, only singletons that are not pooled are supported"
+            )
+        calls = [self.call(callable, slots) for callable, slots in step.calls]
+        variable = f"d{len(self.variables)}"
+        value = f"[{', '.join(calls)}]" if step.group else calls[0]
+        self.lines.append(f"    {variable} = {value}")
+        self.variables[identity] = variable
+        self.keys.append(step.key)
+
+    def call(self, callable: Any, slots: List[Slot]) -> str:
+        args = []
+        for slot in slots:
+            if slot.key is Lifecycle:
+                args.append("lifecycle")
+            elif slot.missing:
+                args.append(self.default(slot))
+            elif slot.resolve is not None:
+                raise PyDITypeError(
+                    f"Cannot generate code for the lazy dependency {key_name(slot.key)}"
+                )
+            else:
+                args.append(self.variables[key_identity(slot.key)])
+        return f"{self.reference(callable)}({', '.join(args)})"
+
+    def default(self, slot: Slot) -> str:
+        # defaults of optional dependencies that are not provided are literals
+        if slot.default is None or isinstance(slot.default, (bool, int, float, str)):
+            return repr(slot.default)
+        raise PyDITypeError(
+            f"Cannot generate code for the default of the optional dependency {key_name(slot.key)}"
+        )
+
+    def key(self, key: ProviderKey) -> str:
+        return repr(key) if isinstance(key, str) else self.reference(key)
+
+    def reference(self, target: Any) -> str:
+        # returns the expression of an imported object, importing it if needed
+        if isinstance(target, DeferredImport):
+            module, qualname = target.module, target.name
+        else:
+            module = getattr(target, "__module__", None)
+            qualname = getattr(target, "__qualname__", None)
+        if module is None or qualname is None or "<" in qualname or module == "__main__":
+            raise PyDITypeError(f"Cannot generate code for {target!r}, it cannot be imported")
+
+        top, _, attributes = qualname.partition(".")
+        alias = self.imports.get((module, top))
+        if alias is None:
+            alias = f"_i{len(self.imports)}"
+            self.imports[(module, top)] = alias
+            self.import_lines.append(f"from {module} import {top} as {alias}")
+        return f"{alias}.{attributes}" if attributes else alias
+
+
+def generate(app: App, source: str, output: str | None = None) -> str:
+    return Generator(app, source, output).generate()
+
+
+def load_app(source: str) -> App:
+    # source is "pkg.module:name", of an App or of a function returning one
+    target = DeferredImport(source).load()
+    if not isinstance(target, App) and callable(target):
+        target = target()
+    if not isinstance(target, App):
+        raise PyDITypeError(f"{source} is not an App")
+    return target
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="generates the construction code of a dinjections App")
+    parser.add_argument("source", help="dotted path of the App, as pkg.module:name")
+    parser.add_argument("--output", help="file to write the module to, defaults to stdout")
+    parser.add_argument("--check", action="store_true", help="only check that the output is up to date")
+    args = parser.parse_args(argv)
+
+    code = generate(load_app(args.source), args.source, args.output)
+    if args.check:
+        if not args.output:
+            parser.error("--check requires --output")
+        try:
+            with open(args.output) as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != code:
+            print(f"{args.output} is out of date with {args.source}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(code)
+    else:
+        sys.stdout.write(code)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
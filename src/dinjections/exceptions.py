@@ -1,3 +1,6 @@
+import difflib
+
+
 class PyDIException(Exception):
     pass
 
@@ -11,8 +14,62 @@ class MissingHintError(PyDIException):
 
 
 class MissingDependencyError(PyDIException):
-    pass
+    # when raised with the missing key, the message is only formatted when it
+    # is read, suggesting the provided keys with the closest names
+    def __init__(self, *args, key=None, owner=None, provides=None):
+        super().__init__(*args)
+        self.key = key
+        self.owner = owner
+        self.provides = provides
+
+    def __str__(self) -> str:
+        if self.key is None:
+            return super().__str__()
+        name = _name(self.key)
+        message = f"Cannot find dependency {name}"
+        if self.owner is not None:
+            message += f" for {_name(self.owner)}"
+        if self.provides:
+            candidates = difflib.get_close_matches(name, [_name(key) for key in self.provides], n=3, cutoff=0.5)
+            if candidates:
+                message += ", did you mean " + " or ".join(candidates) + "?"
+        return message
 
 
 class DependencyTypeError(PyDIException):
     pass
+
+
+class CyclicDependencyError(PyDIException, RecursionError):
+    pass
+
+
+class AmbiguousDependencyError(PyDIException):
+    pass
+
+
+class ProviderError(PyDIException):
+    # raised when a provider fails, with the key it was building
+    def __init__(self, message: str, key=None):
+        super().__init__(message)
+        self.key = key
+
+
+class ScopeError(PyDIException):
+    pass
+
+
+class ValidationError(PyDIException):
+    def __init__(self, errors: list):
+        self.errors = errors
+        super().__init__("\n".join(str(e) for e in errors))
+
+
+class LifecycleError(PyDIException):
+    def __init__(self, errors: list):
+        self.errors = errors
+        super().__init__("\n".join(str(e) for e in errors))
+
+
+def _name(key) -> str:
+    return key if isinstance(key, str) else getattr(key, "__qualname__", repr(key))
@@ -0,0 +1,26 @@
+import os
+import threading
+import weakref
+
+
+# apps to reset in forked children. the fork handler is registered once, and
+# apps are released when they are garbage collected
+_apps = weakref.WeakSet()
+_lock = threading.Lock()
+_registered = False
+
+
+def track_fork(app):
+    global _registered
+    if not hasattr(os, "register_at_fork"):
+        return
+    with _lock:
+        _apps.add(app)
+        if not _registered:
+            os.register_at_fork(after_in_child=_after_fork_in_child)
+            _registered = True
+
+
+def _after_fork_in_child():
+    for app in list(_apps):
+        app.after_fork()
@@ -0,0 +1,161 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from .lifecycle import *
+from .module import *
+from .plan import *
+from .registry import *
+
+
+# invoke of the providers being built, and the duration and transitive
+# requirements of the ones already built, by key identity
+resolving: ContextVar[Tuple[str | None, Dict[Any, tuple]] | None] = ContextVar("resolving", default=None)
+
+
+class ProviderEvent:
+    # This is a class to store the construction of a provider: the time spent
+    # in the provider itself, the time spent building the dependencies it
+    # needed, and the invoke that caused it to be built, None when it was
+    # built by get or call.
+    def __init__(self, key: ProviderKey, duration: float, dependencies: float, invoke: str | None):
+        self.key = key
+        self.duration = duration
+        self.dependencies = dependencies
+        self.invoke = invoke
+
+    @property
+    def total(self) -> float:
+        return self.duration + self.dependencies
+
+
+class HookEvent:
+    # This is a class to store the execution of a lifecycle hook.
+    def __init__(self, hook: Hook, phase: str, duration: float):
+        self.hook = hook
+        self.phase = phase
+        self.duration = duration
+
+
+class Listener:
+    # This is the base class of the objects notified while an app is built and
+    # run. Listeners only override the events they are interested in.
+    def on_provider(self, event: ProviderEvent):
+        pass
+
+    def on_hook(self, event: HookEvent):
+        pass
+
+    def on_container(self, key: ProviderKey, hit: bool):
+        pass
+
+
+class Recorder(Listener):
+    # This is a listener that keeps every event, to be read with App.stats.
+    def __init__(self):
+        self.providers: List[ProviderEvent] = []
+        self.hooks: List[HookEvent] = []
+        self.hits = 0
+        self.misses = 0
+
+    def on_provider(self, event: ProviderEvent):
+        self.providers.append(event)
+
+    def on_hook(self, event: HookEvent):
+        self.hooks.append(event)
+
+    def on_container(self, key: ProviderKey, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {
+                key_name(e.key): {
+                    "duration": e.duration,
+                    "dependencies": e.dependencies,
+                    "total": e.total,
+                    "invoke": e.invoke,
+                }
+                for e in self.providers
+            },
+            "hooks": [
+                {"hook": e.hook, "phase": e.phase, "duration": e.duration}
+                for e in self.hooks
+            ],
+            "container": {"hits": self.hits, "misses": self.misses},
+        }
+
+
+class Instrument:
+    # This is a class that sends events to the listeners of an app. Code paths
+    # check listeners before measuring anything, so it costs nothing when empty.
+    def __init__(self, listeners: List[Listener] | None = None):
+        self.listeners: List[Listener] = list(listeners or [])
+
+    def provider(self, event: ProviderEvent):
+        for listener in self.listeners:
+            listener.on_provider(event)
+
+    def hook(self, hook: Hook, phase: str, duration: float):
+        event = HookEvent(hook, phase, duration)
+        for listener in self.listeners:
+            listener.on_hook(event)
+
+    def container(self, key: ProviderKey, hit: bool):
+        for listener in self.listeners:
+            listener.on_container(key, hit)
+
+    @contextmanager
+    def resolve(self, name: str | None) -> Iterator[None]:
+        # groups the providers built in this context, by the invoke that
+        # needs them or None for get and call. nested resolutions, like lazy
+        # proxies used by an invoke, belong to the outer one
+        if resolving.get() is not None:
+            yield
+            return
+        token = resolving.set((name, {}))
+        try:
+            yield
+        finally:
+            resolving.reset(token)
+
+    def timed(self, build: Callable, step: Step, *args) -> ConternerTargetType:
+        # builds step with build, reporting the construction to the listeners
+        if not self.listeners:
+            return build(step, *args)
+        start = time.perf_counter()
+        value = build(step, *args)
+        self.built(step, time.perf_counter() - start)
+        return value
+
+    def built(self, step: Step, duration: float):
+        # a provider depends on the time of every step built before it in the
+        # same resolution that it requires transitively, each one counted once
+        name, durations = resolving.get() or (None, {})
+        closure = set()
+        for require in step.requires:
+            closure |= durations.get(key_identity(require), (0, set()))[1]
+        self.provider(ProviderEvent(
+            step.key,
+            duration,
+            sum(durations[i][0] for i in closure),
+            name,
+        ))
+        closure.add(key_identity(step.key))
+        durations[key_identity(step.key)] = (duration, closure)
+
+    def invoke(self, invoke: InvokeStep, container: ContainerType):
+        # counts the dependencies of an invoke that are already built
+        for slot in invoke.slots:
+            if slot.key is not Lifecycle and slot.key in container:
+                self.container(slot.key, True)
+        for step in invoke.steps:
+            self.container(step.key, step.key in container)
+
+
+def invoke_name(invoke: InvokeStep) -> str:
+    return getattr(invoke.target.callable, "__qualname__", repr(invoke.target.callable))
@@ -0,0 +1,158 @@
+import os
+import threading
+import weakref
+from collections.abc import Sequence
+from typing import Any, Callable
+
+
+# proxies and groups whose lock is replaced in forked children, where it may
+# have been held by a thread of the parent. keyed by id, proxies forward
+# hashing to their target
+_locked = weakref.WeakValueDictionary()
+
+
+class LazyProxy:
+    # This is a class that stands in for a dependency until it is used. The
+    # dependency is resolved on first access, exactly once, even when the proxy
+    # is shared between threads, and every access is then forwarded to it.
+    __slots__ = ("_resolve", "_lock", "_target", "__weakref__")
+
+    def __init__(self, resolve: Callable[[], Any]):
+        object.__setattr__(self, "_resolve", resolve)
+        object.__setattr__(self, "_lock", threading.Lock())
+        _locked[id(self)] = self
+
+    @property
+    def __class__(self):
+        return type(resolve_proxy(self))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(resolve_proxy(self), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(resolve_proxy(self), name, value)
+
+    def __delattr__(self, name: str):
+        delattr(resolve_proxy(self), name)
+
+    def __repr__(self) -> str:
+        if not is_resolved(self):
+            return f"<LazyProxy unresolved at {id(self):#x}>"
+        return repr(resolve_proxy(self))
+
+    def __str__(self) -> str:
+        return str(resolve_proxy(self))
+
+    def __bool__(self) -> bool:
+        return bool(resolve_proxy(self))
+
+    def __eq__(self, other: Any) -> bool:
+        return resolve_proxy(self) == other
+
+    def __ne__(self, other: Any) -> bool:
+        return resolve_proxy(self) != other
+
+    def __hash__(self) -> int:
+        return hash(resolve_proxy(self))
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return resolve_proxy(self)(*args, **kwargs)
+
+    def __len__(self) -> int:
+        return len(resolve_proxy(self))
+
+    def __iter__(self):
+        return iter(resolve_proxy(self))
+
+    def __contains__(self, item: Any) -> bool:
+        return item in resolve_proxy(self)
+
+    def __getitem__(self, key: Any) -> Any:
+        return resolve_proxy(self)[key]
+
+    def __setitem__(self, key: Any, value: Any):
+        resolve_proxy(self)[key] = value
+
+    def __delitem__(self, key: Any):
+        del resolve_proxy(self)[key]
+
+    def __enter__(self) -> Any:
+        return resolve_proxy(self).__enter__()
+
+    def __exit__(self, *exc) -> Any:
+        return resolve_proxy(self).__exit__(*exc)
+
+
+def resolve_proxy(proxy: LazyProxy) -> Any:
+    # returns the object behind a proxy, building it if needed. attributes are
+    # read with object.__getattribute__ so they are not forwarded
+    try:
+        return object.__getattribute__(proxy, "_target")
+    except AttributeError:
+        pass
+    with object.__getattribute__(proxy, "_lock"):
+        try:
+            return object.__getattribute__(proxy, "_target")
+        except AttributeError:
+            target = object.__getattribute__(proxy, "_resolve")()
+            object.__setattr__(proxy, "_target", target)
+            object.__setattr__(proxy, "_resolve", None)
+            return target
+
+
+def is_resolved(proxy: LazyProxy) -> bool:
+    try:
+        object.__getattribute__(proxy, "_target")
+        return True
+    except AttributeError:
+        return False
+
+
+class LazyGroup(Sequence):
+    # This is a class that stands in for the list of a group dependency. Each
+    # member is built the first time it is accessed and then kept, so consumers
+    # that stop iterating early only pay for the members they have seen.
+    def __init__(self, size: int, build: Callable[[int], Any]):
+        self._build = build
+        self._members = [_missing] * size
+        self._lock = threading.Lock()
+        _locked[id(self)] = self
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        member = self._members[index]
+        if member is not _missing:
+            return member
+        with self._lock:
+            member = self._members[index]
+            if member is _missing:
+                member = self._build(index % len(self))
+                self._members[index] = member
+            return member
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def built(self) -> int:
+        # number of members built so far
+        return sum(member is not _missing for member in self._members)
+
+    def __repr__(self) -> str:
+        return f"<LazyGroup {self.built()}/{len(self)} built>"
+
+
+_missing = object()
+
+
+def _after_fork_in_child():
+    for instance in list(_locked.values()):
+        object.__setattr__(instance, "_lock", threading.Lock())
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,21 +1,258 @@
+import asyncio
+import inspect
+import itertools
+import signal
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, List, Tuple
+
+from .exceptions import *
+
+
+# key and dependency layer of the provider being built, read when hooks are
+# appended so they can be stopped in reverse dependency order
+building: ContextVar[Tuple[Any, int | None]] = ContextVar("building", default=(None, None))
+
+_sequence = itertools.count()
+
+
 class Hook:
     def __init__(self, on_start: callable = None, on_stop: callable = None):
         self.on_start = on_start
         self.on_stop = on_stop
+        # set when the hook is appended to a lifecycle
+        self.key = None
+        self.layer = None
+        self.sequence = 0
+        self.started = False
 
 
 class Lifecycle:
     def __init__(self) -> None:
         self.hooks = []
+        # set by the app, to report the duration of each hook
+        self.instrument = None
 
     def append_hook(self, hook: Hook):
+        hook.key, hook.layer = building.get()
+        hook.sequence = next(_sequence)
         self.hooks.append(hook)
 
     def start(self):
+        # starts the hooks that were not started yet, in order of registration.
+        # if one of them fails, the ones already started are stopped
         for hook in self.hooks:
+            if hook.started:
+                continue
             try:
                 if callable(hook.on_start):
-                    hook.on_start()
-            finally:
+                    self.call_hook(hook, "start")
+            except BaseException:
+                self.stop()
+                raise
+            hook.started = True
+
+    def stop(self):
+        # stops the started hooks, in reverse order of registration
+        errors = []
+        for hook in reversed(self.hooks):
+            if not hook.started:
+                continue
+            hook.started = False
+            try:
                 if callable(hook.on_stop):
-                    hook.on_stop()
+                    self.call_hook(hook, "stop")
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise LifecycleError(errors)
+
+    def call_hook(self, hook: Hook, phase: str):
+        return call_hook(hook, phase, self.instrument)
+
+    async def start_async(self):
+        # starts the pending hooks in dependency order, the hooks of a layer
+        # concurrently
+        hooks = [hook for hook in self.hooks if not hook.started]
+        await start_hooks_async(hooks, self.instrument)
+
+    async def stop_async(self):
+        hooks = [hook for hook in self.hooks if hook.started]
+        await stop_hooks_async(hooks, self.instrument)
+
+
+def call_hook(hook: Hook, phase: str, instrument=None) -> Any:
+    fn = hook.on_start if phase == "start" else hook.on_stop
+    if instrument is None or not instrument.listeners:
+        return fn()
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        instrument.hook(hook, phase, time.perf_counter() - start)
+
+
+def hook_name(hook: Hook, phase: str) -> str:
+    fn = hook.on_start if phase == "start" else hook.on_stop
+    return getattr(fn, "__qualname__", repr(fn))
+
+
+def stop_layers(hooks: List[Hook]) -> List[List[Hook]]:
+    # groups hooks by dependency layer, dependents first. hooks appended
+    # outside of a provider are stopped before everything else
+    layers = {}
+    for hook in hooks:
+        layers.setdefault(hook.layer, []).append(hook)
+    order = sorted(layers, key=lambda layer: float("inf") if layer is None else layer, reverse=True)
+    return [sorted(layers[layer], key=lambda h: h.sequence, reverse=True) for layer in order]
+
+
+def start_layers(hooks: List[Hook]) -> List[List[Hook]]:
+    # groups hooks by dependency layer, dependencies first. hooks appended
+    # outside of a provider are started after everything else
+    return [sorted(layer, key=lambda h: h.sequence) for layer in reversed(stop_layers(hooks))]
+
+
+def stop_hooks(
+    hooks: List[Hook],
+    instrument=None,
+    timeout: float | None = None,
+    hook_timeout: float | None = None,
+):
+    # stops hooks in reverse dependency order. hooks of the same layer are
+    # stopped concurrently, each one within hook_timeout seconds and all of
+    # them within timeout seconds. hooks that do not finish in time are left
+    # running and reported, together with any error raised by the others
+    errors = []
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for layer in stop_layers(hooks):
+        for hook in layer:
+            hook.started = False
+        layer = [hook for hook in layer if callable(hook.on_stop)]
+        if not layer:
+            continue
+
+        if len(layer) == 1 and deadline is None and hook_timeout is None:
+            try:
+                call_hook(layer[0], "stop", instrument)
+            except Exception as e:
+                errors.append(e)
+            continue
+
+        threads = []
+        for hook in layer:
+            result = []
+
+            def stop(hook=hook, result=result):
+                try:
+                    call_hook(hook, "stop", instrument)
+                except Exception as e:
+                    result.append(e)
+
+            thread = threading.Thread(target=stop, name=f"stop {hook_name(hook, 'stop')}", daemon=True)
+            thread.start()
+            threads.append((hook, thread, result))
+
+        started = time.monotonic()
+        for hook, thread, result in threads:
+            limits = []
+            if hook_timeout is not None:
+                limits.append(started + hook_timeout)
+            if deadline is not None:
+                limits.append(deadline)
+            thread.join(max(0, min(limits) - time.monotonic()) if limits else None)
+            if thread.is_alive():
+                errors.append(TimeoutError(f"Stop hook {hook_name(hook, 'stop')} did not finish in time"))
+            errors.extend(result)
+
+    if errors:
+        raise LifecycleError(errors)
+
+
+async def call_hook_async(hook: Hook, phase: str, instrument=None):
+    fn = hook.on_start if phase == "start" else hook.on_stop
+    if not callable(fn):
+        return
+    start = time.perf_counter()
+    result = fn()
+    if inspect.isawaitable(result):
+        await result
+    if instrument is not None and instrument.listeners:
+        instrument.hook(hook, phase, time.perf_counter() - start)
+
+
+async def start_hooks_async(hooks: List[Hook], instrument=None):
+    # starts hooks in dependency order, the hooks of a layer concurrently. if
+    # any fails, the ones that started are stopped
+    for layer in start_layers(hooks):
+        results = await asyncio.gather(
+            *(call_hook_async(hook, "start", instrument) for hook in layer),
+            return_exceptions=True,
+        )
+        for hook, result in zip(layer, results):
+            if not isinstance(result, BaseException):
+                hook.started = True
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            try:
+                await stop_hooks_async([hook for hook in hooks if hook.started], instrument)
+            except LifecycleError:
+                pass
+            raise errors[0]
+
+
+async def stop_hooks_async(
+    hooks: List[Hook],
+    instrument=None,
+    timeout: float | None = None,
+    hook_timeout: float | None = None,
+):
+    # same as stop_hooks, with the hooks of a layer awaited concurrently
+    errors = []
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for layer in stop_layers(hooks):
+        for hook in layer:
+            hook.started = False
+        limits = []
+        if hook_timeout is not None:
+            limits.append(hook_timeout)
+        if deadline is not None:
+            limits.append(max(0, deadline - time.monotonic()))
+        limit = min(limits) if limits else None
+
+        async def stop(hook: Hook):
+            try:
+                await asyncio.wait_for(call_hook_async(hook, "stop", instrument), limit)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Stop hook {hook_name(hook, 'stop')} did not finish in time")
+
+        results = await asyncio.gather(*(stop(hook) for hook in layer), return_exceptions=True)
+        errors.extend(result for result in results if isinstance(result, Exception))
+
+    if errors:
+        raise LifecycleError(errors)
+
+
+def wait_for_signal(signals=(signal.SIGINT, signal.SIGTERM)):
+    # blocks the main thread until one of the signals is received
+    received = threading.Event()
+    previous = {s: signal.signal(s, lambda *_: received.set()) for s in signals}
+    try:
+        while not received.wait(1):
+            pass
+    finally:
+        for s, handler in previous.items():
+            signal.signal(s, handler)
+
+
+async def wait_for_signal_async(signals=(signal.SIGINT, signal.SIGTERM)):
+    loop = asyncio.get_running_loop()
+    received = asyncio.Event()
+    for s in signals:
+        loop.add_signal_handler(s, received.set)
+    try:
+        await received.wait()
+    finally:
+        for s in signals:
+            loop.remove_signal_handler(s)
@@ -1,17 +1,43 @@
-import inspect
-from os.path import normpath
-from typing import Any, Dict, List, Type
+from typing import Any, Dict, Generic, Hashable, List, Protocol, Tuple, Type
 
 from .exceptions import *
 from .lifecycle import *
+from .registry import *
+
+
+# scopes define how long a built dependency lives: singletons are kept in the
+# app container, request scoped dependencies are kept in a child scope,
+# transient dependencies are built again for every injection and weak ones are
+# kept only while something else holds a reference to them
+SINGLETON = "singleton"
+REQUEST = "request"
+TRANSIENT = "transient"
+WEAK = "weak"
+SCOPES = (SINGLETON, REQUEST, TRANSIENT, WEAK)
 
 
 class ProvideTarget:
     # This is a class to store the dependencies definitions within a module.
-    def __init__(self, callable: callable, provides: str, requires: List[str]):
+    def __init__(
+        self,
+        callable: callable,
+        provides: str,
+        requires: List[str],
+        scope: str = SINGLETON,
+        lazy: bool = False,
+        type: Type | None = None,
+        fork_safe: bool = True,
+        pool: int | None = None,
+    ):
         self.callable = callable
         self.provides = provides
         self.requires = requires
+        self.scope = scope
+        self.lazy = lazy
+        self.fork_safe = fork_safe
+        self.pool = pool
+        # class of the provided object, when it is known before building it
+        self.type = type
 
 
 ProviderKey = str | Type
@@ -29,21 +55,71 @@ class InvokeTarget:
 
 class Provider:
     # This is a class that is used to build advanced dependencies definitions.
-    def __init__(self, provider: object, name: str | None = None, group: bool = False):
+    def __init__(
+        self,
+        provider: object,
+        name: str | None = None,
+        group: bool = False,
+        scope: str = SINGLETON,
+        lazy: bool = False,
+        fork_safe: bool = True,
+        pool: int | None = None,
+        optional: bool = False,
+        default: Any = None,
+    ):
+        if scope not in SCOPES:
+            raise PyDITypeError(f"Provider scope must be one of {', '.join(SCOPES)}, got {scope!r}")
+        if pool is not None and (pool < 1 or group or scope != SINGLETON):
+            raise PyDITypeError("Provider pool must be a positive size, of a singleton that is not grouped")
+        if group and scope in (TRANSIENT, WEAK):
+            raise PyDITypeError(f"Provider of a group cannot be {scope} scoped")
         self.provider = provider
         self.name = name
         if name is None:
             self.name = provider
         self.group = group
+        self.scope = scope
+        # lazy dependencies are injected as a proxy, built on first use
+        self.lazy = lazy
+        # dependencies that are not fork safe are rebuilt in forked processes
+        self.fork_safe = fork_safe
+        # pooled dependencies are injected as a Pool of up to pool instances
+        self.pool = pool
+        # optional requirements that are not provided are injected as default
+        self.optional = optional
+        self.default = default
 
 
 class Annotations:
-    def __init__(self, name: str | None = None, group: bool = False):
+    def __init__(
+        self,
+        name: str | None = None,
+        group: bool = False,
+        scope: str = SINGLETON,
+        lazy: bool = False,
+        fork_safe: bool = True,
+        pool: int | None = None,
+        optional: bool = False,
+    ):
         self.name = name
         self.group = group
+        self.scope = scope
+        self.lazy = lazy
+        self.fork_safe = fork_safe
+        self.pool = pool
+        self.optional = optional
 
     def to_provider(self, provider: object) -> Provider:
-        return Provider(provider, name=self.name, group=self.group)
+        return Provider(
+            provider,
+            name=self.name,
+            group=self.group,
+            scope=self.scope,
+            lazy=self.lazy,
+            fork_safe=self.fork_safe,
+            pool=self.pool,
+            optional=self.optional,
+        )
 
 
 class Option:
@@ -57,7 +133,7 @@ class Module(Option):
     # and also holds the lifecycle object and the built dependencies.
     def __init__(self, *args):
         self.lifecycle = Lifecycle()
-        self._provides: ProvidesType = {}
+        self._provides: ProvidesType = Registry()
         self._invokes: List[InvokeTarget] = []
 
         for option in args:
@@ -79,98 +155,6 @@ class Module(Option):
     def get_provides(self) -> ProvidesType:
         return self._provides
 
-    def build_dependencies(self, target: ProvideTarget | InvokeTarget) -> List:
-        inject = []
-        for require in target.requires:
-            if require == Lifecycle:
-                inject.append(self.lifecycle)
-                continue
-
-            key = require
-            if isinstance(require, Provider):
-                key = require.name
-
-            provides_target = key_in(key, self._provides)
-            if provides_target is None:
-                tg = ""
-                if isinstance(target, ProvideTarget):
-                    tg = f" for target {target.provides}"
-                elif isinstance(require, type):
-                    tg = f" for target {target}"
-                raise MissingDependencyError(
-                    f"Cannot find dependency{tg}: {key}, {self._provides}"
-                )
-
-            target = key_in(key, self.container)
-            if target is not None:
-                if isinstance(require, Provider) and inspect.isclass(target) and not issubclass(
-                    target, require.provider
-                ):
-                    raise DependencyTypeError(
-                        "Dependency is of wrong type",
-                        key,
-                        target,
-                        "but should be of type",
-                        require.provider,
-                    )
-                inject.append(target)
-            else:
-                provider = self.build_provider(provides_target)
-                if isinstance(require, Provider):
-                    if not require.group and not issubclass(
-                        provider.__class__, require.provider
-                    ):
-                        raise DependencyTypeError(
-                            "Dependency is of wrong type",
-                            key,
-                            provider.__class__,
-                            "but should be of type",
-                            require.provider,
-                        )
-                    if require.group and not issubclass(
-                        provider[0].__class__, require.provider
-                    ):
-                        raise DependencyTypeError(
-                            "Dependency is of wrong type",
-                            key,
-                            provider[0].__class__,
-                            "but should be of type",
-                            require.group,
-                        )
-                self.container[key] = provider
-                inject.append(provider)
-
-        return inject
-
-    def build_provider(
-        self, target: ProvideTarget | List[ProvideTarget]
-    ) -> ConternerTargetType:
-        if isinstance(target, ProvideTarget):
-            inject = self.build_dependencies(target)
-            try:
-                return target.callable(*inject)
-            except TypeError as e:
-                if "missing" in str(e):
-                    raise MissingHintError(
-                        str(e), "verify if all hints are set")
-                raise e
-
-        elements = []
-        for element in target:
-            if not isinstance(element, ProvideTarget):
-                raise PyDITypeError(
-                    "Provide target list element must be of type ProvideTarget"
-                )
-            inject = self.build_dependencies(element)
-            try:
-                elements.append(element.callable(*inject))
-            except TypeError as e:
-                if "missing" in str(e):
-                    raise MissingHintError(
-                        str(e), "verify if all hints are set")
-                raise e
-        return elements
-
     def add_provides(self, targets: ProvidesType):
         if not isinstance(targets, Dict):
             raise PyDITypeError("Provide targets must be a dict")
@@ -186,7 +170,7 @@ class Module(Option):
                             "Provide target list element must be of type ProvideTarget"
                         )
 
-        self._provides = self._provides | targets
+        self._provides.merge(targets)
 
     def add_invokes(self, targets: List[InvokeTarget]):
         for target in targets:
@@ -197,18 +181,52 @@ class Module(Option):
 
 
 def key_in(key: ProviderKey, elements: Dict[ProviderKey, Any]) -> ProvideTarget:
+    if isinstance(elements, Registry):
+        return elements.get(key, None)
+
     if isinstance(key, str):
         return elements.get(key, None)
 
-    elif isinstance(key, Type):
-        for k, v in elements.items():
-            if not isinstance(k, Type):
-                continue
-            # checks if class key is the same as k
-            if k.__name__ == key.__name__ and normpath(inspect.getfile(k)) == normpath(
-                inspect.getfile(key)
-            ):
-                return v
-    else:
-        raise PyDITypeError("Key must be of type str or a class")
+    # plain dicts are not indexed, so class keys are compared by identity
+    identity = key_identity(key)
+    for k, v in elements.items():
+        if isinstance(k, Type) and key_identity(k) == identity:
+            return v
     return None
+
+
+SupertypesType = Dict[Hashable, List[ProviderKey]]
+
+
+def supertype_index(provides: ProvidesType) -> SupertypesType:
+    # maps the identity of every base class of a provided class to the keys of
+    # the classes providing it, so a base class is resolved with a single dict
+    # lookup. protocols are indexed when they are explicitly subclassed
+    index = {}
+    for key, target in provides.items():
+        if not isinstance(key, type) or not isinstance(target, ProvideTarget):
+            continue
+        for base in key.__mro__[1:]:
+            if base in (object, Generic, Protocol):
+                continue
+            index.setdefault(key_identity(base), []).append(key)
+    return index
+
+
+def key_lookup(
+    key: ProviderKey, provides: ProvidesType, supertypes: SupertypesType | None = None
+) -> Tuple[ProviderKey, ProvideTarget | List[ProvideTarget] | None]:
+    # returns the key providing key and its target, which is the key itself
+    # unless key is only provided by a subclass
+    target = key_in(key, provides)
+    if target is not None or not supertypes or not isinstance(key, type):
+        return key, target
+    keys = supertypes.get(key_identity(key))
+    if not keys:
+        return key, None
+    if len(keys) > 1:
+        raise AmbiguousDependencyError(
+            f"Dependency {key_name(key)} is provided by more than one class: "
+            + ", ".join(key_name(k) for k in keys)
+        )
+    return keys[0], key_in(keys[0], provides)
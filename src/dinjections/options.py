@@ -1,4 +1,8 @@
-from typing import get_type_hints, Annotated, get_origin, get_args, Generic, TypeVar
+import importlib
+import inspect
+import weakref
+from types import UnionType
+from typing import get_type_hints, Annotated, get_origin, get_args, Generic, TypeVar, Union
 
 from .app import *
 from .exceptions import *
@@ -17,6 +21,14 @@ class Provide(Option):
     def __init__(self, *args):
         self._targets = {}
         for arg in args:
+            if isinstance(arg, Provider) and isinstance(arg.provider, str):
+                # dotted path, imported when the dependency is first resolved
+                self.add_target(arg, DeferredProvideTarget(
+                    arg.provider, provides=arg.name, scope=arg.scope, lazy=arg.lazy,
+                    fork_safe=arg.fork_safe, pool=arg.pool,
+                ))
+                continue
+
             if isinstance(arg, Provider):
                 hints = get_hints(arg.provider.__init__)
                 self.init_provider(arg, hints, arg.provider)
@@ -27,7 +39,7 @@ class Provide(Option):
                 hints = get_hints(arg.__init__)
                 self._targets[arg] = ProvideTarget(
                     callable=arg, provides=arg, requires=get_requires_from_hints(
-                        hints)
+                        hints), type=arg
                 )
                 continue
 
@@ -47,6 +59,7 @@ class Provide(Option):
                         callable=arg,
                         provides=hints["return"],
                         requires=get_requires_from_hints(hints),
+                        type=hints["return"],
                     )
                     continue
 
@@ -54,45 +67,209 @@ class Provide(Option):
                 "Provide target must be a callable constructor, a class or a Provider: ", arg)
 
     def init_provider(self, arg: Provider, hints: dict, call: callable):
+        provides_type = arg.provider if isinstance(arg.provider, type) else None
+        self.add_target(arg, ProvideTarget(
+            callable=call,
+            provides=arg.name,
+            requires=get_requires_from_hints(hints),
+            scope=arg.scope,
+            lazy=arg.lazy,
+            type=provides_type,
+            fork_safe=arg.fork_safe,
+            pool=arg.pool,
+        ))
+
+    def add_target(self, arg: Provider, target: ProvideTarget):
         if not arg.group:
-            self._targets[arg.name] = ProvideTarget(
-                callable=call,
-                provides=arg.name,
-                requires=get_requires_from_hints(hints),
-            )
+            self._targets[arg.name] = target
+            return
 
-        else:
-            if arg.name not in self._targets:
-                self._targets[arg.name] = []
-
-            self._targets[arg.name].append(
-                ProvideTarget(
-                    callable=call,
-                    provides=arg.name,
-                    requires=get_requires_from_hints(hints),
-                )
-            )
+        if arg.name not in self._targets:
+            self._targets[arg.name] = []
+        self._targets[arg.name].append(target)
 
     def apply(self, mod: Module):
         mod.add_provides(self._targets)
 
 
+class DeferredImport:
+    # This is a callable standing in for a provider given as "pkg.module:Name".
+    # The module is imported the first time the provider is loaded or called.
+    def __init__(self, path: str):
+        module, _, name = path.partition(":")
+        if not module or not name:
+            raise PyDITypeError(
+                "Provider path must be of the form 'pkg.module:Name'", path)
+        self.path = path
+        self.module = module
+        self.name = name
+        self.target = None
+
+    def load(self) -> callable:
+        if self.target is None:
+            target = importlib.import_module(self.module)
+            for attr in self.name.split("."):
+                target = getattr(target, attr)
+            self.target = target
+        return self.target
+
+    def __call__(self, *args):
+        return self.load()(*args)
+
+    def __repr__(self) -> str:
+        return f"<DeferredImport {self.path}>"
+
+
+class DeferredProvideTarget(ProvideTarget):
+    # This is a provide target registered by dotted path. Its requirements and
+    # type are read from the imported target the first time they are needed,
+    # so registering it does not import anything.
+    def __init__(
+        self,
+        path: str,
+        provides: ProviderKey,
+        scope: str = SINGLETON,
+        lazy: bool = False,
+        fork_safe: bool = True,
+        pool: int | None = None,
+    ):
+        self._requires = None
+        self._type = None
+        super().__init__(
+            callable=DeferredImport(path),
+            provides=provides,
+            requires=None,
+            scope=scope,
+            lazy=lazy,
+            fork_safe=fork_safe,
+            pool=pool,
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self.callable.target is not None
+
+    @property
+    def requires(self) -> List:
+        if self._requires is None:
+            target = self.callable.load()
+            if isinstance(target, type):
+                self._requires = get_requires_from_hints(get_hints(target.__init__))
+                self._type = target
+            else:
+                hints = get_hints(target)
+                self._requires = get_requires_from_hints(hints)
+                returns = hints.get("return")
+                if isinstance(returns, Provider):
+                    returns = returns.provider
+                if isinstance(returns, type):
+                    self._type = returns
+        return self._requires
+
+    @requires.setter
+    def requires(self, requires: List):
+        self._requires = requires
+
+    @property
+    def type(self) -> Type | None:
+        self.requires
+        return self._type
+
+    @type.setter
+    def type(self, type: Type | None):
+        self._type = type
+
+
+# parsed hints are shared by every Provide and Invoke of the same callable,
+# callables that cannot be weakly referenced (builtins) are kept in a plain dict
+_hints = weakref.WeakKeyDictionary()
+_static_hints = {}
+
+
 def get_hints(arg):
-    # check if has annotations
+    # check if it is an object provided directly
     if issubclass(type(arg), Parameter):
         return {"return": type(arg)}
-    if not hasattr(arg, "__annotations__"):
-        return get_type_hints(arg)
-    hints = arg.__annotations__
-    for key, value in hints.items():
+
+    cache = _hints
+    try:
+        return _hints[arg]
+    except KeyError:
+        pass
+    except TypeError:
+        cache = _static_hints
+        try:
+            return _static_hints[arg]
+        except (KeyError, TypeError):
+            pass
+
+    hints = parse_hints(arg)
+    try:
+        cache[arg] = hints
+    except TypeError:
+        # unhashable callables are parsed every time
+        pass
+    return hints
+
+
+def parse_hints(arg) -> dict:
+    # resolves string and forward reference hints, falling back to the raw
+    # annotations when they cannot be resolved. the annotations of arg are
+    # never modified, Annotated hints are converted in a new dict. arguments
+    # hinted as Optional or with a default value are optional requirements
+    try:
+        annotations = get_type_hints(arg, include_extras=True)
+    except (NameError, TypeError):
+        annotations = getattr(arg, "__annotations__", {})
+    try:
+        parameters = inspect.signature(arg).parameters
+    except (TypeError, ValueError):
+        parameters = {}
+
+    hints = {}
+    for key, value in annotations.items():
+        value, optional = unwrap_optional(value)
         if get_origin(value) == Annotated:
             for a in value.__metadata__:
                 if isinstance(a, Annotations):
-                    hints[key] = a.to_provider(get_args(value)[0])
+                    provided, inner = unwrap_optional(get_args(value)[0])
+                    value = a.to_provider(provided)
+                    optional = optional or inner
                     break
+
+        param = parameters.get(key)
+        default = param is not None and param.default is not param.empty
+        if key != "return" and (optional or default):
+            if isinstance(value, type):
+                value = Provider(value)
+            elif isinstance(value, str):
+                # string keys do not tell the type of the dependency
+                value = Provider(object, name=value)
+            elif not isinstance(value, Provider):
+                # generics like list[int] are keyed by their class, other
+                # hints cannot be provided and always take their default
+                origin = get_origin(value)
+                if isinstance(origin, type):
+                    value = Provider(origin)
+                else:
+                    value = Provider(object, name=str(value))
+            if isinstance(value, Provider):
+                value.optional = True
+                value.default = param.default if default else None
+        hints[key] = value
     return hints
 
 
+def unwrap_optional(hint) -> tuple:
+    # returns the hint without None, and whether None was part of it
+    if get_origin(hint) not in (Union, UnionType):
+        return hint, False
+    args = [a for a in get_args(hint) if a is not type(None)]
+    if len(args) != 1 or len(args) == len(get_args(hint)):
+        return hint, False
+    return args[0], True
+
+
 class Invoke(Option):
     def __init__(self, *args):
         self._targets = []
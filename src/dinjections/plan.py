@@ -0,0 +1,602 @@
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from contextlib import nullcontext
+from functools import partial
+from typing import Any, Callable, Collection, Dict, List, Tuple
+
+from .exceptions import *
+from .lazy import *
+from .lifecycle import *
+from .module import *
+from .pool import *
+from .registry import *
+
+
+class Slot:
+    # This is a class to store a pre-resolved argument of a step: the key to
+    # read from the container and the type the dependency is expected to have.
+    # Lazy slots have the function used to resolve the key when it is not built,
+    # and stream slots resolve a group to a LazyGroup instead of a proxy.
+    # Missing slots are optional dependencies that are not provided, they are
+    # always resolved to their default. Slots of base classes resolved to the
+    # subclass providing them keep the key they were required with.
+    __slots__ = ("key", "expects", "group", "resolve", "stream", "missing", "default", "required", "eager")
+
+    def __init__(
+        self,
+        key: ProviderKey,
+        expects: type | None = None,
+        group: bool = False,
+        resolve: Callable[[ProviderKey], Any] | None = None,
+        stream: bool = False,
+        missing: bool = False,
+        default: Any = None,
+        required: ProviderKey | None = None,
+    ):
+        self.key = key
+        self.expects = expects
+        self.group = group
+        self.resolve = resolve
+        self.stream = stream
+        self.missing = missing
+        self.default = default
+        self.required = required
+        # set when the dependency has to be built before the target is called
+        self.eager = key is not Lifecycle and resolve is None and not missing
+
+
+class Step:
+    # This is a class to store the construction of one provided key.
+    # Group keys have one call per member of the group.
+    __slots__ = ("key", "calls", "group", "module", "scope", "pool", "requires", "layer")
+
+    def __init__(
+        self,
+        key: ProviderKey,
+        calls: List[Tuple[Callable, List[Slot]]],
+        group: bool,
+        module: Module,
+        scope: str = SINGLETON,
+        pool: int | None = None,
+    ):
+        self.key = key
+        self.calls = calls
+        self.group = group
+        self.module = module
+        self.scope = scope
+        # size of the pool built in place of the dependency
+        self.pool = pool
+        # length of the longest chain of requirements below this step
+        self.layer = 0
+        self.requires = []
+        for _, slots in calls:
+            for slot in slots:
+                if not slot.eager:
+                    continue
+                if slot.key not in self.requires:
+                    self.requires.append(slot.key)
+
+
+class InvokeStep:
+    # This is a class to store an invoke target with the steps that have to be
+    # executed before it, in dependency order. Errors found while compiling are
+    # kept and raised when the invoke is reached.
+    __slots__ = ("target", "module", "slots", "steps", "error", "layer")
+
+    def __init__(
+        self,
+        target: InvokeTarget,
+        module: Module,
+        slots: List[Slot],
+        steps: List[Step],
+        error: Exception | None = None,
+    ):
+        self.target = target
+        self.module = module
+        self.slots = slots
+        self.steps = steps
+        self.error = error
+        self.layer = 0
+
+
+class CallPlan:
+    # This is a class to store how to call a function with its dependencies:
+    # the arguments read directly from the container, the ones that need a
+    # slot to be built (lifecycle, lazy or typed dependencies), and the ones
+    # that are not provided and have to be passed by the caller.
+    __slots__ = ("params", "reads", "slots", "extra", "keys", "lifecycle", "pooled", "supplied")
+
+    def __init__(
+        self,
+        params: List[str],
+        slots: List[Tuple[str, Slot]],
+        extra: List[Tuple[str, ProviderKey]],
+        lifecycle: Lifecycle,
+        pooled: List[str] | None = None,
+        supplied: List[str] | None = None,
+    ):
+        # names of every parameter, to bind positional arguments
+        self.params = tuple(params)
+        self.reads = tuple(
+            (name, slot.key)
+            for name, slot in slots
+            if slot.eager and slot.expects is None
+        )
+        self.slots = tuple(
+            (name, slot)
+            for name, slot in slots
+            if not slot.eager or slot.expects is not None
+        )
+        self.extra = tuple(extra)
+        # keys that have to be built before the function is called
+        self.keys = tuple(
+            slot.key for _, slot in slots if slot.eager
+        )
+        self.lifecycle = lifecycle
+        # arguments checked out of their pool for the duration of a call
+        self.pooled = tuple(pooled or ())
+        # extra arguments that were not resolved because they were passed
+        self.supplied = tuple(supplied or ())
+
+    def covers(self, extra: Collection[str]) -> bool:
+        # whether the plan can be used for a call passing extra
+        return all(name in extra for name in self.supplied)
+
+    def args(self, container: ContainerType, extra: Dict[str, Any]) -> Dict[str, Any]:
+        # raises KeyError when a dependency is not built yet
+        kwargs = dict(extra)
+        for name, key in self.reads:
+            if name not in kwargs:
+                value = container[key]
+                kwargs[name] = value.get() if type(value) is Factory else value
+        for name, slot in self.slots:
+            if name not in kwargs:
+                kwargs[name] = build_args((slot,), self.lifecycle, container)[0]
+        for name, key in self.extra:
+            if name not in kwargs:
+                raise MissingDependencyError(f"Cannot find dependency for argument {name}: {key_name(key)}")
+        return kwargs
+
+
+class Factory:
+    # This is a class stored in the container in place of the dependency of a
+    # transient or weak step. Transient dependencies are built again every time
+    # they are read, weak ones are kept through a weak reference and only built
+    # again once they were garbage collected.
+    __slots__ = ("step", "container", "lifecycle", "ref", "lock")
+
+    def __init__(self, step: Step, container: ContainerType, lifecycle: Lifecycle | None = None):
+        self.step = step
+        self.container = container
+        self.lifecycle = lifecycle
+        self.ref = None
+        self.lock = threading.Lock()
+
+    def after_fork(self):
+        self.lock = threading.Lock()
+
+    def get(self) -> ConternerTargetType:
+        if self.step.scope == TRANSIENT:
+            return build_member(self.step, 0, self.container, self.lifecycle)
+
+        value = self.ref() if self.ref is not None else None
+        if value is not None:
+            return value
+        with self.lock:
+            value = self.ref() if self.ref is not None else None
+            if value is None:
+                value = build_member(self.step, 0, self.container, self.lifecycle)
+                try:
+                    self.ref = weakref.ref(value)
+                except TypeError:
+                    raise PyDITypeError(
+                        f"Weak dependency {key_name(self.step.key)} of type"
+                        f" {value.__class__.__qualname__} cannot be weakly referenced"
+                    )
+            return value
+
+
+def load(value: Any) -> Any:
+    # returns the dependency stored in the container as value
+    if type(value) is Factory:
+        return value.get()
+    return value
+
+
+class Compiler:
+    # This is a class that sorts the provide graph topologically, without
+    # recursion, producing a flat list of steps for each invoke.
+    def __init__(
+        self,
+        provides: ProvidesType,
+        resolve: Callable[[ProviderKey], Any] | None = None,
+        stream: Callable[[ProviderKey], Any] | None = None,
+        supertypes: SupertypesType | None = None,
+    ):
+        self.provides = provides
+        # base classes of the provided classes, see supertype_index
+        self.supertypes = supertypes
+        # used by lazy slots to build their dependency on first use, and by
+        # lazy group slots to build the members of a group one by one
+        self.resolve = resolve
+        self.stream = stream
+        self.steps: Registry = Registry()
+
+    def compile_invoke(self, invoke: InvokeTarget, module: Module) -> InvokeStep:
+        steps = []
+        try:
+            slots = self.slots(invoke)
+            for slot in slots:
+                if not slot.eager:
+                    continue
+                self.visit(slot.key, module, steps)
+                check_scope(None, self.steps[slot.key])
+        except CyclicDependencyError:
+            raise
+        except PyDIException as e:
+            return InvokeStep(invoke, module, [], [], error=e)
+        step = InvokeStep(invoke, module, slots, steps)
+        step.layer = 1 + max(
+            (self.steps[slot.key].layer for slot in slots if slot.eager),
+            default=-1,
+        )
+        return step
+
+    def slots(self, target: ProvideTarget | InvokeTarget) -> List[Slot]:
+        slots = []
+        for require in target.requires:
+            if require == Lifecycle:
+                slots.append(Slot(Lifecycle))
+                continue
+
+            key = require
+            if isinstance(require, Provider):
+                key = require.name
+
+            required, (key, provides_target) = key, self.lookup(key)
+            required = None if key is required else required
+            if provides_target is None:
+                if isinstance(require, Provider) and require.optional:
+                    slots.append(Slot(key, missing=True, default=require.default))
+                    continue
+                owner = target.provides if isinstance(target, ProvideTarget) else target.callable
+                raise MissingDependencyError(key=key, owner=owner, provides=self.provides)
+
+            lazy = isinstance(require, Provider) and require.lazy
+            if isinstance(provides_target, ProvideTarget) and provides_target.lazy:
+                lazy = True
+            stream = lazy and isinstance(provides_target, list)
+            resolve = None
+            if lazy:
+                resolve = self.stream if stream else self.resolve
+
+            if isinstance(require, Provider):
+                slots.append(Slot(
+                    key,
+                    expects=require.provider,
+                    group=require.group,
+                    resolve=resolve,
+                    stream=stream,
+                    required=required,
+                ))
+            else:
+                slots.append(Slot(key, resolve=resolve, stream=stream, required=required))
+        return slots
+
+    def lookup(self, key: ProviderKey) -> Tuple[ProviderKey, ProvideTarget | List[ProvideTarget] | None]:
+        return key_lookup(key, self.provides, self.supertypes)
+
+    def step(self, key: ProviderKey, module: Module) -> Step:
+        key, target = self.lookup(key)
+        if target is None:
+            raise MissingDependencyError(key=key, provides=self.provides)
+        if isinstance(target, ProvideTarget):
+            slots = self.slots(target)
+            if target.scope in (TRANSIENT, WEAK) and any(slot.key is Lifecycle for slot in slots):
+                # every instance would append hooks that are never stopped
+                raise ScopeError(
+                    f"{target.scope.capitalize()} dependency {key_name(key)} cannot require the Lifecycle"
+                )
+            return Step(key, [(target.callable, slots)], False, module, target.scope, target.pool)
+
+        calls = []
+        scope = SINGLETON
+        for element in target:
+            if not isinstance(element, ProvideTarget):
+                raise PyDITypeError(
+                    "Provide target list element must be of type ProvideTarget"
+                )
+            calls.append((element.callable, self.slots(element)))
+            if element.scope == REQUEST:
+                scope = REQUEST
+        return Step(key, calls, True, module, scope)
+
+    def visit(self, key: ProviderKey, module: Module, out: List[Step]):
+        # depth first search with an explicit stack, steps are appended to out
+        # after all of their requirements
+        if key is Lifecycle or key in self.steps:
+            return
+        key = self.lookup(key)[0]
+        if key in self.steps:
+            return
+
+        root = self.step(key, module)
+        path = [root]
+        pending = [iter(root.requires)]
+        on_path = {key_identity(key)}
+        while path:
+            require = next(pending[-1], None)
+            if require is None:
+                step = path.pop()
+                pending.pop()
+                on_path.discard(key_identity(step.key))
+                step.layer = 1 + max((self.steps[r].layer for r in step.requires), default=-1)
+                self.steps[step.key] = step
+                out.append(step)
+                continue
+
+            if require in self.steps:
+                check_scope(path[-1], self.steps[require])
+                continue
+
+            identity = key_identity(require)
+            if identity in on_path:
+                start = next(
+                    i for i, s in enumerate(path) if key_identity(s.key) == identity
+                )
+                cycle = [key_name(s.key) for s in path[start:]] + [key_name(require)]
+                raise CyclicDependencyError(
+                    "Cyclic dependency: " + " -> ".join(cycle)
+                )
+
+            step = self.step(require, module)
+            check_scope(path[-1], step)
+            path.append(step)
+            pending.append(iter(step.requires))
+            on_path.add(identity)
+
+    def closure(self, key: ProviderKey, module: Module) -> List[Step]:
+        # returns every step needed to build key, in dependency order, including
+        # the ones that were already compiled for other keys
+        key = self.lookup(key)[0]
+        self.visit(key, module, [])
+        out = []
+        seen = set()
+        stack = [(self.steps[key], False)]
+        while stack:
+            step, expanded = stack.pop()
+            if expanded:
+                out.append(step)
+                continue
+            identity = key_identity(step.key)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            stack.append((step, True))
+            for require in reversed(step.requires):
+                if key_identity(require) not in seen:
+                    stack.append((self.steps[require], False))
+        return out
+
+    def dependents(self, keys: List[ProviderKey]) -> List[ProviderKey]:
+        # returns keys and the keys of every compiled step that requires any of
+        # them, directly or through other steps, lazily or not. base classes
+        # resolved to a subclass count as required too
+        reverse = {}
+        for step in self.steps.values():
+            for _, slots in step.calls:
+                for slot in slots:
+                    if slot.key is not Lifecycle:
+                        reverse.setdefault(key_identity(slot.key), []).append(step.key)
+                    if slot.required is not None:
+                        reverse.setdefault(key_identity(slot.required), []).append(step.key)
+
+        out = []
+        seen = set()
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            identity = key_identity(key)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            out.append(key)
+            stack.extend(reverse.get(identity, []))
+        return out
+
+
+def check_scope(parent: Step | None, step: Step):
+    # singletons and invokes live longer than a request, so they cannot
+    # hold request scoped dependencies
+    if step.scope == REQUEST and (parent is None or parent.scope != REQUEST):
+        owner = "invoke" if parent is None else key_name(parent.key)
+        raise ScopeError(
+            f"Request scoped dependency {key_name(step.key)} cannot be injected into {owner}"
+        )
+
+
+def call_target(callable: Callable, args: List[Any]) -> Any:
+    try:
+        return callable(*args)
+    except TypeError as e:
+        if "missing" in str(e):
+            raise MissingHintError(str(e), "verify if all hints are set")
+        raise e
+
+
+def check_type(slot: Slot, value: Any):
+    cls = value[0].__class__ if slot.group else value.__class__
+    if not issubclass(cls, slot.expects):
+        raise DependencyTypeError(
+            "Dependency is of wrong type",
+            slot.key,
+            cls,
+            "but should be of type",
+            slot.expects,
+        )
+
+
+def build_args(slots: List[Slot], lifecycle: Lifecycle, container: ContainerType) -> List[Any]:
+    args = []
+    for slot in slots:
+        if slot.key is Lifecycle:
+            args.append(lifecycle)
+            continue
+        if slot.missing:
+            args.append(slot.default)
+            continue
+        if slot.resolve is not None and slot.key not in container:
+            if slot.stream:
+                args.append(slot.resolve(slot.key))
+            else:
+                args.append(LazyProxy(partial(slot.resolve, slot.key)))
+            continue
+        value = container[slot.key]
+        if type(value) is Factory:
+            value = value.get()
+        if slot.expects is not None and type(value) is not Pool:
+            check_type(slot, value)
+        args.append(value)
+    return args
+
+
+def build_member(
+    step: Step, index: int, container: ContainerType, lifecycle: Lifecycle | None = None
+) -> Any:
+    # builds a single call of a step, the only one for steps that are not groups
+    callable, slots = step.calls[index]
+    token = building.set((step.key, step.layer))
+    try:
+        return call_target(callable, build_args(slots, lifecycle or step.module.lifecycle, container))
+    finally:
+        building.reset(token)
+
+
+def build_step(
+    step: Step, container: ContainerType, lifecycle: Lifecycle | None = None
+) -> ConternerTargetType:
+    if step.scope in (TRANSIENT, WEAK):
+        return Factory(step, container, lifecycle)
+    if step.pool is not None:
+        return build_pool(step, container, lifecycle)
+    elements = [build_member(step, i, container, lifecycle) for i in range(len(step.calls))]
+    if step.group:
+        return elements
+    return elements[0]
+
+
+def build_pool(step: Step, container: ContainerType, lifecycle: Lifecycle | None = None) -> Pool:
+    # the pool is closed on stop, after everything that depends on it
+    lifecycle = lifecycle or step.module.lifecycle
+    pool = Pool(partial(build_member, step, 0, container, lifecycle), step.pool)
+    token = building.set((step.key, step.layer))
+    try:
+        lifecycle.append_hook(Hook(on_stop=pool.close))
+    finally:
+        building.reset(token)
+    return pool
+
+
+def build_steps_parallel(
+    steps: List[Step],
+    container: ContainerType,
+    executor: Executor,
+    report: Callable[[Step, float], None] | None = None,
+    lock: Callable[[ProviderKey], Any] | None = None,
+):
+    # builds the steps that are not in the container yet on the executor,
+    # submitting each step as soon as all of its requirements are built.
+    # lock returns the lock of a key, held while it is built and stored so a
+    # key resolved by another thread at the same time is built once. members
+    # of a group are submitted separately and the group is stored by the
+    # calling thread. when report is given, it is called from the calling
+    # thread with the time each step took, the sum of its members for groups
+    lock = lock or (lambda key: nullcontext())
+    pending = {key_identity(step.key) for step in steps if step.key not in container}
+    waiting = {}
+    dependents = {}
+    ready = []
+    for step in steps:
+        identity = key_identity(step.key)
+        if identity not in pending:
+            continue
+        requires = [r for r in step.requires if key_identity(r) in pending]
+        waiting[identity] = len(requires)
+        for require in requires:
+            dependents.setdefault(key_identity(require), []).append(step)
+        if not requires:
+            ready.append(step)
+
+    futures = {}
+    members = {}
+    left = {}
+    durations = {}
+
+    def build_member_timed(step: Step, index: int) -> Tuple[Any, float]:
+        start = time.perf_counter()
+        return build_member(step, index, container), time.perf_counter() - start
+
+    def build_locked(step: Step) -> Tuple[Any, float | None]:
+        # the duration is None when another thread built the step
+        with lock(step.key):
+            if step.key in container:
+                return container[step.key], None
+            start = time.perf_counter()
+            value = build_step(step, container)
+            container[step.key] = value
+            return value, time.perf_counter() - start
+
+    def submit(step: Step):
+        if step.group and len(step.calls) > 1 and step.key not in container:
+            members[key_identity(step.key)] = [None] * len(step.calls)
+            left[key_identity(step.key)] = len(step.calls)
+            durations[key_identity(step.key)] = 0.0
+            for index in range(len(step.calls)):
+                futures[executor.submit(build_member_timed, step, index)] = (step, index)
+        else:
+            futures[executor.submit(build_locked, step)] = (step, None)
+
+    for step in ready:
+        submit(step)
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            step, index = futures.pop(future)
+            try:
+                value, duration = future.result()
+            except Exception as e:
+                for other in futures:
+                    other.cancel()
+                # errors of the app are raised as they are, like when steps
+                # are built sequentially
+                if isinstance(e, PyDIException):
+                    raise
+                raise ProviderError(
+                    f"Cannot build provider {key_name(step.key)}: {e!r}", key=step.key
+                ) from e
+
+            identity = key_identity(step.key)
+            if index is not None:
+                members[identity][index] = value
+                durations[identity] += duration
+                left[identity] -= 1
+                if left[identity]:
+                    continue
+                value = members.pop(identity)
+                duration = durations.pop(identity)
+                with lock(step.key):
+                    if step.key in container:
+                        # built by another thread in the meantime
+                        duration = None
+                    else:
+                        container[step.key] = value
+            if report is not None and duration is not None:
+                report(step, duration)
+
+            for dependent in dependents.get(identity, []):
+                identity = key_identity(dependent.key)
+                waiting[identity] -= 1
+                if waiting[identity] == 0:
+                    submit(dependent)
@@ -0,0 +1,109 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+
+class Pool:
+    # This is a class holding up to size instances of a dependency that cannot
+    # be shared between threads. Instances are built when they are first
+    # needed and checked out by one consumer at a time, the others wait until
+    # one of them is returned.
+    def __init__(self, build: Callable[[], Any], size: int):
+        self.build = build
+        self.size = size
+        # instances built, and places taken by them or by builds in progress
+        self.instances: List[Any] = []
+        self.reserved = 0
+        self.idle: List[Any] = []
+        self.closed = False
+        self.condition = threading.Condition()
+        # number of checkouts that had to wait, and the time they waited
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def acquire(self, timeout: float | None = None) -> Any:
+        with self.condition:
+            start = None
+            while True:
+                if self.closed:
+                    raise RuntimeError("Pool is closed")
+                if self.idle:
+                    return self.idle.pop()
+                if self.reserved < self.size:
+                    # reserved while it is built, outside of the lock
+                    self.reserved += 1
+                    break
+                # an instance is returned, or a build failed and freed its place
+                if start is None:
+                    start = time.perf_counter()
+                    self.waits += 1
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                waited = time.perf_counter()
+                ready = remaining is None or remaining > 0
+                if ready:
+                    ready = self.condition.wait(remaining)
+                self.wait_time += time.perf_counter() - waited
+                if not ready and not self.idle and self.reserved >= self.size:
+                    raise TimeoutError(f"No instance of the pool was returned within {timeout} seconds")
+
+        try:
+            instance = self.build()
+        except BaseException:
+            with self.condition:
+                self.reserved -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.instances.append(instance)
+        return instance
+
+    def release(self, instance: Any):
+        with self.condition:
+            if self.closed:
+                close_instance(instance)
+                return
+            self.idle.append(instance)
+            self.condition.notify()
+
+    @contextmanager
+    def checkout(self, timeout: float | None = None) -> Iterator[Any]:
+        instance = self.acquire(timeout)
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+    def close(self):
+        # closes the idle instances, and the busy ones when they are returned
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.condition.notify_all()
+        for instance in idle:
+            close_instance(instance)
+
+    def after_fork(self):
+        # instances checked out by threads of the parent are never returned
+        self.condition = threading.Condition()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            created = len(self.instances)
+            return {
+                "size": self.size,
+                "created": created,
+                "idle": len(self.idle),
+                "busy": created - len(self.idle),
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+    def __repr__(self) -> str:
+        return f"<Pool {len(self.idle)}/{len(self.instances)} idle, size {self.size}>"
+
+
+def close_instance(instance: Any):
+    close = getattr(instance, "close", None)
+    if callable(close):
+        close()
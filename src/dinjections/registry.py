@@ -0,0 +1,153 @@
+import inspect
+import weakref
+from os.path import normpath
+from typing import Any, Dict, Hashable, Type
+
+from .exceptions import *
+
+
+# identities are computed once per class and released with the class
+_identities: "weakref.WeakKeyDictionary[type, tuple]" = weakref.WeakKeyDictionary()
+_missing = object()
+
+
+def key_identity(key: Any) -> Hashable:
+    # Returns the value used to index a provider key. Strings are their own
+    # identity, classes are identified by qualified name and normalized source
+    # path, so the same class imported through different paths is the same key.
+    if isinstance(key, str):
+        return key
+    if not isinstance(key, Type):
+        raise PyDITypeError("Key must be of type str or a class")
+
+    identity = _identities.get(key)
+    if identity is None:
+        try:
+            source = normpath(inspect.getfile(key))
+        except TypeError:
+            # builtin classes have no source file
+            source = key.__module__
+        identity = (key.__qualname__, source)
+        try:
+            _identities[key] = identity
+        except TypeError:
+            pass
+    return identity
+
+
+class Registry(dict):
+    # This is a dict keyed by provider keys that keeps an index by key identity,
+    # so class keys are resolved with a single dict lookup.
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._index: Dict[Hashable, Any] = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        # the value is stored before it is indexed, so concurrent readers never
+        # find an indexed key without its value
+        identity = key_identity(key)
+        previous = self._index.get(identity, _missing)
+        super().__setitem__(key, value)
+        self._index[identity] = key
+        if previous is not _missing and previous is not key and previous != key:
+            super().__delitem__(previous)
+
+    def __getitem__(self, key):
+        # keys are usually the stored key itself, which needs no identity
+        value = dict.get(self, key, _missing)
+        if value is not _missing:
+            return value
+        stored = self._index.get(key_identity(key), _missing)
+        if stored is _missing:
+            raise KeyError(key)
+        return super().__getitem__(stored)
+
+    def __delitem__(self, key):
+        identity = key_identity(key)
+        stored = self._index.pop(identity)
+        super().__delitem__(stored)
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key):
+            return True
+        try:
+            return key_identity(key) in self._index
+        except PyDITypeError:
+            return False
+
+    def __or__(self, other):
+        merged = Registry(self)
+        merged.update(other)
+        return merged
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, _missing)
+        if value is not _missing:
+            return value
+        stored = self._index.get(key_identity(key), _missing)
+        if stored is _missing:
+            return default
+        return super().__getitem__(stored)
+
+    def update(self, *args, **kwargs):
+        for other in args:
+            items = other.items() if hasattr(other, "items") else other
+            for key, value in items:
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def merge(self, other):
+        # merges provides in place, in registration order: a later target
+        # replaces the one of the same key, and a later group is appended to
+        # the group of the same key. groups are copied once, when they are
+        # first merged, and then extended, so merging never copies the registry
+        for key, value in other.items():
+            if isinstance(value, list):
+                current = self.get(key)
+                if isinstance(current, list):
+                    current.extend(value)
+                    continue
+                value = list(value)
+            self[key] = value
+        return self
+
+    def setdefault(self, key, default=None):
+        stored = self._index.get(key_identity(key), _missing)
+        if stored is not _missing:
+            return super().__getitem__(stored)
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        stored = self._index.get(key_identity(key), _missing)
+        if stored is _missing:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        del self._index[key_identity(key)]
+        return super().pop(stored)
+
+    def popitem(self):
+        key, value = super().popitem()
+        del self._index[key_identity(key)]
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._index.clear()
+
+    def copy(self):
+        return Registry(self)
+
+
+def key_name(key: Any) -> str:
+    # Returns a readable name of a provider key, to be used in messages.
+    if isinstance(key, str):
+        return key
+    return getattr(key, "__qualname__", repr(key))
@@ -0,0 +1,58 @@
+from collections import ChainMap
+from typing import Any
+
+from .lifecycle import *
+from .module import *
+from .plan import *
+from .registry import *
+
+
+class Scope:
+    # This is a child container of an App. Request scoped dependencies are built
+    # into the scope, everything else is read from and built into the container
+    # of the app, which is never copied.
+    def __init__(self, app, values: ContainerType | None = None):
+        self.app = app
+        self.lifecycle = Lifecycle()
+        self.values = Registry(values) if values else Registry()
+        self.container = ChainMap(self.values, app.container)
+
+    def __enter__(self) -> "Scope":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, key: ProviderKey) -> Any:
+        instrument = self.app.instrument
+        try:
+            value = self.container[key]
+        except KeyError:
+            pass
+        else:
+            if instrument.listeners:
+                instrument.container(key, True)
+            return load(value)
+
+        if instrument.listeners:
+            instrument.container(key, False)
+        parent = self.container.maps[1]
+        plan = self.app.plan_for(key)
+        with instrument.resolve(None):
+            for step in plan:
+                if step.scope == REQUEST:
+                    if step.key not in self.values:
+                        self.values[step.key] = instrument.timed(
+                            build_step, step, self.container, self.lifecycle
+                        )
+                elif step.key not in parent:
+                    self.app.build_once(step, parent)
+        self.lifecycle.start()
+        return load(self.container[plan[-1].key])
+
+    def close(self):
+        # stops the hooks registered by request scoped dependencies
+        try:
+            self.lifecycle.stop()
+        finally:
+            self.values.clear()
@@ -0,0 +1,177 @@
+import inspect
+from typing import Callable, List
+
+from .exceptions import *
+from .lifecycle import *
+from .module import *
+from .options import *
+from .registry import *
+
+
+class Validator:
+    # This is a class that checks the requirements of every provider and invoke
+    # against the provides, without building anything, collecting every problem
+    # instead of stopping at the first one.
+    def __init__(
+        self, modules: List[Module], provides: ProvidesType, supertypes: SupertypesType | None = None
+    ):
+        self.modules = modules
+        self.provides = provides
+        self.supertypes = supertypes
+        self.errors: List[PyDIException] = []
+
+    def validate(self) -> List[PyDIException]:
+        for key, target in self.provides.items():
+            for element in target if isinstance(target, list) else [target]:
+                self.check_target(element, key_name(key), element.scope)
+        for module in self.modules:
+            for invoke in module._invokes:
+                self.check_target(invoke, callable_name(invoke.callable), None)
+        self.check_cycles()
+        return self.errors
+
+    def check_target(self, target: ProvideTarget | InvokeTarget, name: str, scope: str | None):
+        for param in unhinted(target.callable):
+            self.errors.append(MissingHintError(f"Missing hint for argument {param} of {name}"))
+
+        try:
+            requires = target.requires
+        except (ImportError, AttributeError) as e:
+            # providers given by dotted path are imported to read their hints
+            self.errors.append(ProviderError(
+                f"Cannot import the provider of {name} from {target.callable.path}: {e!r}", key=target.provides
+            ))
+            return
+
+        for require in requires:
+            if require == Lifecycle:
+                continue
+
+            key = require
+            if isinstance(require, Provider):
+                key = require.name
+            try:
+                key, provided = key_lookup(key, self.provides, self.supertypes)
+            except (PyDITypeError, AmbiguousDependencyError) as e:
+                self.errors.append(e)
+                continue
+
+            if provided is None:
+                if not (isinstance(require, Provider) and require.optional):
+                    self.errors.append(MissingDependencyError(key=key, owner=name, provides=self.provides))
+                continue
+
+            elements = provided if isinstance(provided, list) else [provided]
+            if isinstance(require, Provider):
+                self.check_group(require, provided, name)
+                self.check_types(require, elements, name)
+            if scope != REQUEST and not require_is_lazy(require, provided):
+                if any(element.scope == REQUEST for element in elements):
+                    owner = "invoke " + name if scope is None else name
+                    self.errors.append(ScopeError(
+                        f"Request scoped dependency {key_name(key)} cannot be injected into {owner}"
+                    ))
+
+    def check_group(self, require: Provider, provided: ProvideTarget | List[ProvideTarget], name: str):
+        if require.group and not isinstance(provided, list):
+            self.errors.append(DependencyTypeError(
+                f"Dependency {key_name(require.name)} of {name} is required as a group but is not provided as one"
+            ))
+        elif not require.group and isinstance(provided, list):
+            self.errors.append(DependencyTypeError(
+                f"Dependency {key_name(require.name)} of {name} is provided as a group but is not required as one"
+            ))
+
+    def check_types(self, require: Provider, elements: List[ProvideTarget], name: str):
+        if not isinstance(require.provider, type):
+            return
+        for element in elements:
+            try:
+                provided = element.type
+            except (ImportError, AttributeError):
+                # reported with the provider itself
+                continue
+            if provided is not None and not issubclass(provided, require.provider):
+                self.errors.append(DependencyTypeError(
+                    f"Dependency {key_name(require.name)} of {name} is of type {provided.__qualname__}"
+                    f" but should be of type {require.provider.__qualname__}"
+                ))
+
+    def check_cycles(self):
+        # iterative depth first search over every provided key, each back edge
+        # is reported once with the path that closes the cycle
+        done = set()
+        for root in self.provides:
+            if key_identity(root) in done:
+                continue
+            path = [root]
+            pending = [iter(self.edges(root))]
+            on_path = {key_identity(root): 0}
+            while path:
+                require = next(pending[-1], None)
+                if require is None:
+                    key = path.pop()
+                    pending.pop()
+                    del on_path[key_identity(key)]
+                    done.add(key_identity(key))
+                    continue
+
+                identity = key_identity(require)
+                if identity in done:
+                    continue
+                if identity in on_path:
+                    cycle = [key_name(k) for k in path[on_path[identity]:]] + [key_name(require)]
+                    self.errors.append(CyclicDependencyError("Cyclic dependency: " + " -> ".join(cycle)))
+                    continue
+
+                on_path[identity] = len(path)
+                path.append(require)
+                pending.append(iter(self.edges(require)))
+
+    def edges(self, key: ProviderKey) -> List[ProviderKey]:
+        provided = key_in(key, self.provides)
+        edges = []
+        for element in provided if isinstance(provided, list) else [provided]:
+            try:
+                requires = element.requires
+            except (ImportError, AttributeError):
+                continue
+            for require in requires:
+                if require == Lifecycle:
+                    continue
+                dependency = require.name if isinstance(require, Provider) else require
+                try:
+                    dependency, target = key_lookup(dependency, self.provides, self.supertypes)
+                except (PyDITypeError, AmbiguousDependencyError):
+                    continue
+                if target is not None and not require_is_lazy(require, target):
+                    edges.append(dependency)
+        return edges
+
+
+def require_is_lazy(require, provided: ProvideTarget | List[ProvideTarget]) -> bool:
+    if isinstance(require, Provider) and require.lazy:
+        return True
+    return isinstance(provided, ProvideTarget) and provided.lazy
+
+
+def unhinted(target: Callable) -> List[str]:
+    # returns the arguments of target that have no hint and no default value
+    if isinstance(target, Parameter):
+        return []
+    try:
+        signature = inspect.signature(target)
+    except (TypeError, ValueError):
+        return []
+    hints = get_hints(target.__init__ if isinstance(target, type) else target)
+    return [
+        name
+        for name, param in signature.parameters.items()
+        if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)
+        and param.default is param.empty
+        and name not in hints
+    ]
+
+
+def callable_name(target: Callable) -> str:
+    return getattr(target, "__qualname__", repr(target))
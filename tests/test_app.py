@@ -1,5 +1,12 @@
+import gc
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
 import unittest
-from typing import Annotated
+from typing import Annotated, Any, Dict, Optional, Protocol
 
 from src.dinjections import *
 
@@ -321,6 +328,889 @@ class TestApp(unittest.TestCase):
             self.fail("Exception: " + str(e))
         self.assertTrue(True)
 
+    def test_cyclic_dependency_path(self):
+        def new_test_class_1(p: TestClass3) -> TestClass1:
+            return TestClass1()
+
+        def new_test_class_3(p: TestClass1) -> TestClass3:
+            return TestClass3()
+
+        with self.assertRaises(CyclicDependencyError) as ctx:
+            App(
+                Provide(new_test_class_1, new_test_class_3),
+                Invoke(register_hooks),
+            )
+        self.assertIn("TestClass3 -> TestClass1 -> TestClass3", str(ctx.exception))
+
+    def test_deep_chain(self):
+        def link(i):
+            def new_link(d):
+                return d + 1
+
+            new_link.__annotations__ = {
+                "d": Annotated[int, Annotations(name=f"k{i - 1}")],
+                "return": Annotated[int, Annotations(name=f"k{i}")],
+            }
+            return new_link
+
+        def new_root() -> Annotated[int, Annotations(name="k0")]:
+            return 0
+
+        depth = 3 * sys.getrecursionlimit()
+        result = []
+
+        def invoke(d: Annotated[int, Annotations(name=f"k{depth}")]):
+            result.append(d)
+
+        app = App(
+            Provide(new_root, *[link(i) for i in range(1, depth + 1)]),
+            Invoke(invoke),
+        )
+        self.assertEqual(len(app.plan[0].steps), depth + 1)
+        app.run()
+        self.assertEqual(result, [depth])
+
+    def test_parallel(self):
+        built = []
+
+        def slow(name):
+            def new_slow() -> Annotated[TestClass1, Annotations(name=name)]:
+                time.sleep(0.2)
+                built.append(name)
+                return TestClass1()
+            return new_slow
+
+        def new_test_class_3(
+            p: Annotated[TestClass1, Annotations("t1")], p2: Annotated[TestClass1, Annotations("t2")], r: TestClass2
+        ) -> TestClass3:
+            return TestClass3()
+
+        app = App(
+            Provide(slow("t1"), slow("t2"), TestClass2, new_test_class_3),
+            Invoke(register_hooks, register_hooks),
+            max_workers=4,
+        )
+        start = time.perf_counter()
+        app.run()
+        self.assertLess(time.perf_counter() - start, 0.35)
+        self.assertEqual(sorted(built), ["t1", "t2"])
+
+    def test_parallel_group(self):
+        def new_slow() -> Annotated[TestClass1, Annotations(group=True)]:
+            time.sleep(0.1)
+            return TestClass1()
+
+        result = []
+
+        def register(g: Annotated[TestClass1, Annotations(group=True)]):
+            result.extend(g)
+
+        # members are built concurrently also when a listener is attached
+        app = App(Provide(*[new_slow] * 4), Invoke(register), max_workers=4, listeners=[Recorder()])
+        start = time.perf_counter()
+        app.run()
+        self.assertLess(time.perf_counter() - start, 0.3)
+        self.assertEqual(len(result), 4)
+        self.assertGreaterEqual(app.stats()["providers"]["TestClass1"]["duration"], 0.4)
+
+    def test_parallel_error(self):
+        def new_test_class_2() -> TestClass2:
+            raise ValueError("boom")
+
+        app = App(
+            Provide(
+                Provider(TestClass1, "t1"),
+                Provider(TestClass1, "t2"),
+                new_test_class_2,
+                new_test_class_3,
+            ),
+            Invoke(register_hooks),
+            max_workers=2,
+        )
+        with self.assertRaises(ProviderError) as ctx:
+            app.run()
+        self.assertEqual(str(ctx.exception), "Cannot build provider TestClass2: ValueError('boom')")
+        self.assertIs(ctx.exception.key, TestClass2)
+        self.assertIsInstance(ctx.exception.__cause__, ValueError)
+
+        # errors of the app are raised as they are, as when built sequentially
+        def new_unhinted(r) -> TestClass2:
+            return TestClass2()
+
+        def register(t: TestClass2):
+            pass
+
+        for max_workers in (None, 2):
+            with self.assertRaises(MissingHintError):
+                App(Provide(new_unhinted), Invoke(register), max_workers=max_workers).run()
+
+    def test_parallel_single_flight(self):
+        built = []
+
+        def new_slow() -> TestClass2:
+            built.append(1)
+            time.sleep(0.2)
+            return TestClass2()
+
+        def register(t: TestClass2):
+            pass
+
+        app = App(Provide(new_slow), Invoke(register), max_workers=2)
+        starting = threading.Thread(target=app.start)
+        starting.start()
+        time.sleep(0.05)
+        # resolved while start builds it on the executor
+        value = app.get(TestClass2)
+        starting.join()
+        self.assertIs(value, app.get(TestClass2))
+        self.assertEqual(len(built), 1)
+        app.stop()
+
+    def test_hints_cache(self):
+        def new_test_class_3_hints(
+            p: Annotated[TestClass1, Annotations("t1")], r: "TestClass2"
+        ) -> TestClass3:
+            return TestClass3()
+
+        annotations = dict(new_test_class_3_hints.__annotations__)
+        hints = get_hints(new_test_class_3_hints)
+
+        self.assertIs(get_hints(new_test_class_3_hints), hints)
+        self.assertEqual(new_test_class_3_hints.__annotations__, annotations)
+        self.assertIsInstance(hints["p"], Provider)
+        self.assertIs(hints["r"], TestClass2)
+
+        for _ in range(2):
+            app = App(
+                Provide(
+                    Provider(TestClass1, "t1"),
+                    TestClass2,
+                    new_test_class_3_hints,
+                ),
+                Invoke(register_hooks),
+            )
+            app.run()
+
+    def test_stats(self):
+        def new_test_class_2() -> TestClass2:
+            time.sleep(0.05)
+            return TestClass2()
+
+        def register_both(l: Lifecycle, t: TestClass3, t2: TestClass2):
+            l.append_hook(Hook(on_start=lambda: time.sleep(0.01)))
+
+        recorder = Recorder()
+        app = App(
+            Provide(
+                Provider(TestClass1, "t1"),
+                Provider(TestClass1, "t2"),
+                new_test_class_2,
+                new_test_class_3,
+            ),
+            Invoke(register_hooks, register_both),
+            listeners=[recorder],
+        )
+        self.assertIsNone(App().stats())
+        app.run()
+
+        stats = app.stats()
+        providers = stats["providers"]
+        self.assertEqual(set(providers), {"t1", "t2", "TestClass2", "TestClass3"})
+        self.assertGreaterEqual(providers["TestClass2"]["duration"], 0.05)
+        self.assertGreaterEqual(providers["TestClass3"]["dependencies"], 0.05)
+        self.assertLess(providers["TestClass3"]["duration"], 0.05)
+        self.assertEqual(providers["TestClass3"]["invoke"], "register_hooks")
+        self.assertEqual(stats["container"], {"hits": 2, "misses": 4})
+        self.assertGreaterEqual(stats["hooks"][-1]["duration"], 0.01)
+
+        # dependencies built by get are reported too, without an invoke
+        app = App(
+            Provide(Provider(TestClass1, "t1"), Provider(TestClass1, "t2"), new_test_class_2, new_test_class_3),
+            listeners=[Recorder()],
+        )
+        app.get(TestClass3)
+        app.get(TestClass2)
+        with app.scope() as scope:
+            scope.get(TestClass3)
+        stats = app.stats()
+        providers = stats["providers"]
+        self.assertEqual(set(providers), {"t1", "t2", "TestClass2", "TestClass3"})
+        self.assertIsNone(providers["TestClass3"]["invoke"])
+        self.assertGreaterEqual(providers["TestClass3"]["dependencies"], 0.05)
+        self.assertEqual(stats["container"], {"hits": 2, "misses": 1})
+
+    def test_validate(self):
+        def new_test_class_3_invalid(
+            p: Annotated[TestClass1, Annotations("t1")], p2: Annotated[TestClass1, Annotations(group=True)], r
+        ) -> TestClass3:
+            return TestClass3()
+
+        def new_test_class_1(p: TestClass3) -> TestClass1:
+            return TestClass1()
+
+        built = []
+
+        def register_missing(l: Lifecycle, t: TestClass3, t2: TestClass2):
+            built.append(t)
+
+        app = App(
+            Provide(
+                Provider(TestClass2, "t1"),
+                new_test_class_1,
+                new_test_class_3_invalid,
+            ),
+            Invoke(register_missing),
+        )
+        with self.assertRaises(ValidationError) as ctx:
+            app.validate()
+        errors = ctx.exception.errors
+        types = sorted(type(e).__name__ for e in errors)
+        self.assertEqual(types, [
+            "CyclicDependencyError",
+            "DependencyTypeError",
+            "DependencyTypeError",
+            "MissingDependencyError",
+            "MissingHintError",
+        ])
+        self.assertEqual(built, [])
+
+        with self.assertRaises(ValidationError):
+            App(Provide(), Invoke(register_hooks), strict=True)
+
+    def test_validate_valid(self):
+        app = App(
+            Provide(
+                Provider(TestClass1, "t1"),
+                Provider(TestClass1, "t2"),
+                TestClass2,
+                new_test_class_3,
+            ),
+            Invoke(register_hooks),
+            strict=True,
+        )
+        app.validate()
+        app.run()
+
+    def test_deferred_import(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "deferred_heavy.py"), "w") as f:
+                f.write(
+                    "from src.dinjections import Annotated, Annotations\n"
+                    "class Heavy:\n"
+                    "    def __init__(self, t: Annotated[object, Annotations('t1')]):\n"
+                    "        self.t = t\n"
+                )
+            sys.path.insert(0, path)
+            try:
+                result = []
+
+                def register(h: Annotated[object, Annotations("heavy")]):
+                    result.append(h)
+
+                app = App(
+                    Provide(
+                        Provider(TestClass1, "t1"),
+                        Provider("deferred_heavy:Heavy", name="heavy", lazy=True),
+                        Provider("deferred_heavy:Missing", name="unused"),
+                    ),
+                    Invoke(register),
+                )
+                app.run()
+                self.assertNotIn("deferred_heavy", sys.modules)
+                self.assertIsInstance(result[0].t, TestClass1)
+                self.assertIn("deferred_heavy", sys.modules)
+                self.assertEqual(result[0].__class__.__name__, "Heavy")
+            finally:
+                sys.path.remove(path)
+                sys.modules.pop("deferred_heavy", None)
+
+        with self.assertRaises(PyDITypeError):
+            Provide(Provider("deferred_heavy.Heavy", name="heavy"))
+
+        # paths that cannot be imported are reported by the validation
+        def register_thing(t: Annotated[TestClass1, Annotations("thing")]):
+            pass
+
+        with self.assertRaises(ValidationError) as ctx:
+            App(
+                Provide(
+                    Provider("nonexistent_mod:Thing", name="thing"),
+                    Provider("unittest:Nonexistent", name="other"),
+                ),
+                Invoke(register_thing),
+                strict=True,
+            )
+        errors = ctx.exception.errors
+        self.assertEqual([type(e) for e in errors], [ProviderError, ProviderError])
+        self.assertEqual([e.key for e in errors], ["thing", "other"])
+
+    def test_call(self):
+        def handle(request: str, t: TestClass3, l: Lifecycle, c: Annotated[TestClass1, Annotations("t1")]):
+            return request, t, l, c
+
+        app = App(Provide(
+            Provider(TestClass1, "t1"),
+            Provider(TestClass1, "t2"),
+            TestClass2,
+            new_test_class_3,
+        ))
+        request, t, l, c = app.call(handle, request="r")
+        self.assertEqual(request, "r")
+        self.assertIs(t, app.get(TestClass3))
+        self.assertIsInstance(l, Lifecycle)
+        self.assertIs(c, app.get("t1"))
+        self.assertIs(app.call(handle, request="s")[1], t)
+
+        other = TestClass3()
+        self.assertIs(app.call(handle, request="r", t=other)[1], other)
+        with self.assertRaises(MissingDependencyError):
+            app.call(handle)
+
+        # arguments passed by the caller, and hints that are not keys, are not
+        # resolved
+        def handle_payload(payload: Dict[str, Any], items: list[int], t: TestClass3):
+            return payload, items, t
+
+        self.assertEqual(app.call(handle_payload, payload={}, items=[1]), ({}, [1], t))
+        with self.assertRaises(MissingDependencyError):
+            app.call(handle_payload, payload={})
+
+        def handle_service(t: TestClass3):
+            return t
+
+        self.assertIs(app.call(handle_service, t=other), other)
+        self.assertIs(app.call(handle_service), t)
+
+    def test_inject(self):
+        app = App(Provide(TestClass2))
+
+        @app.inject
+        def handle(request: str, t: TestClass2):
+            return request, t
+
+        self.assertEqual(handle.__name__, "handle")
+        self.assertEqual(handle("r"), ("r", app.get(TestClass2)))
+        self.assertEqual(handle(request="s")[0], "s")
+
+        class Handler:
+            def handle(self, request: str, t: TestClass2):
+                return t
+
+        self.assertIs(app.call(Handler().handle, request="r"), app.get(TestClass2))
+
+    def test_derive(self):
+        def new_fake() -> Annotated[TestClass1, Annotations("t1")]:
+            return TestClass1()
+
+        app = App(Provide(
+            Provider(TestClass1, "t1"),
+            Provider(TestClass1, "t2"),
+            TestClass2,
+            new_test_class_3,
+        ))
+        base = [app.get(key) for key in ("t1", "t2", TestClass2, TestClass3)]
+
+        derived = app.derive(Provide(new_fake))
+        self.assertIsNot(derived.get("t1"), base[0])
+        self.assertIs(derived.get("t2"), base[1])
+        self.assertIs(derived.get(TestClass2), base[2])
+        self.assertIsNot(derived.get(TestClass3), base[3])
+        self.assertEqual([app.get(key) for key in ("t1", "t2", TestClass2, TestClass3)], base)
+
+        # without overrides everything built is shared
+        self.assertIs(app.derive().get(TestClass3), base[3])
+
+        # overrides given in a module are only those of the module
+        derived = app.derive(Module(Provide(new_fake)))
+        self.assertIs(derived.get("t2"), base[1])
+        self.assertIs(derived.get(TestClass2), base[2])
+        self.assertIsNot(derived.get(TestClass3), base[3])
+
+        # a group provided again replaces the group of the app
+        def new_member() -> Annotated[TestClass2, Annotations(group=True)]:
+            return TestClass2()
+
+        app = App(Provide(new_member, new_member))
+        self.assertEqual(len(app.derive(Provide(new_member)).get(TestClass2)), 1)
+
+    def test_refresh(self):
+        events = []
+
+        def new_config(l: Lifecycle) -> Annotated[TestClass1, Annotations("t1")]:
+            config = TestClass1()
+            l.append_hook(Hook(
+                on_start=lambda: events.append(("start", config)),
+                on_stop=lambda: events.append(("stop", config)),
+            ))
+            return config
+
+        app = App(
+            Provide(new_config, Provider(TestClass1, "t2"), TestClass2, new_test_class_3),
+            Invoke(register_hooks),
+        )
+        app.start()
+        old = app.container
+        config, service, other = app.get("t1"), app.get(TestClass3), app.get(TestClass2)
+        with app.scope() as scope:
+            app.refresh("t1")
+            self.assertIs(scope.get(TestClass3), service)
+
+        self.assertIsNot(app.get("t1"), config)
+        self.assertIsNot(app.get(TestClass3), service)
+        self.assertIs(app.get(TestClass2), other)
+        self.assertIs(old["t1"], config)
+        self.assertEqual(events, [("start", config), ("start", app.get("t1")), ("stop", config)])
+
+        app.stop()
+        self.assertEqual(events[-1], ("stop", app.get("t1")))
+
+        # members of a group streamed before a refresh are built from the
+        # container that replaced it
+        def new_member(t: Annotated[TestClass1, Annotations("t2")]) -> Annotated[TestClass2, Annotations(group=True)]:
+            return TestClass2()
+
+        app = App(Provide(new_config, Provider(TestClass1, "t2"), new_member, new_member))
+        group = app.stream(TestClass2)
+        app.refresh("t1")
+        self.assertEqual(len(list(group)), 2)
+        self.assertIn("t2", app.container)
+
+    def test_single_flight(self):
+        built = []
+        barrier = threading.Barrier(8)
+
+        def new_pool() -> TestClass1:
+            built.append(1)
+            time.sleep(0.05)
+            return TestClass1()
+
+        app = App(Provide(new_pool, TestClass2))
+        results = []
+
+        def resolve():
+            barrier.wait()
+            results.append(app.get(TestClass1))
+
+        threads = [threading.Thread(target=resolve) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(built), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+
+    def test_warmup(self):
+        started = []
+
+        def new_unused(l: Lifecycle) -> TestClass2:
+            l.append_hook(Hook(on_start=lambda: started.append(TestClass2)))
+            return TestClass2()
+
+        app = App(
+            Provide(
+                Provider(TestClass1, "t1"),
+                Provider(TestClass1, "t2"),
+                new_unused,
+                Provider(TestClass3, scope=REQUEST),
+            ),
+        )
+        app.start(warmup="background")
+        self.assertTrue(app.ready.wait(5))
+        self.assertIn("t1", app.container)
+        self.assertIn(TestClass2, app.container)
+        self.assertNotIn(TestClass3, app.container)
+        self.assertEqual(started, [TestClass2])
+        self.assertEqual(app.warmup_errors, [])
+        app.stop()
+
+        # members of a streamed group are built too
+        def new_member() -> Annotated[TestClass2, Annotations(group=True)]:
+            return TestClass2()
+
+        def register(g: Annotated[TestClass2, Annotations(group=True, lazy=True)]):
+            pass
+
+        app = App(Provide(new_member, new_member), Invoke(register))
+        app.start(warmup="background")
+        self.assertTrue(app.ready.wait(5))
+        self.assertEqual(app.container[TestClass2].built(), 2)
+        app.stop()
+
+        app = App(Provide(TestClass2))
+        app.run()
+        self.assertTrue(app.ready.is_set())
+        self.assertNotIn(TestClass2, app.container)
+        with self.assertRaises(PyDITypeError):
+            app.start(warmup="eager")
+
+    def test_supertype(self):
+        class Store(Protocol):
+            def load(self) -> str:
+                ...
+
+        class Base:
+            pass
+
+        class Implementation(Base, Store):
+            def load(self) -> str:
+                return "loaded"
+
+        class Other(Base):
+            pass
+
+        def handle(s: Store, b: Annotated[Base, Annotations(lazy=True)]) -> TestClass3:
+            return TestClass3()
+
+        def load(s: Store) -> str:
+            return s.load()
+
+        app = App(Provide(Implementation, handle))
+        self.assertIs(app.get(Store), app.get(Implementation))
+        self.assertIs(app.get(Base), app.get(Implementation))
+        self.assertEqual(app.call(load), "loaded")
+        self.assertIsInstance(app.get(TestClass3), TestClass3)
+
+        with self.assertRaises(AmbiguousDependencyError):
+            App(Provide(Implementation, Other, handle))
+        # base classes that are not required are not checked
+        App(Provide(Implementation, Other))
+
+        # consumers of a base class resolved to its subclass use the
+        # provider of the base class of a derived app
+        def new_base() -> Base:
+            return Other()
+
+        handled = app.get(TestClass3)
+        derived = app.derive(Provide(new_base))
+        self.assertIsNot(derived.get(TestClass3), handled)
+        self.assertIsInstance(derived.get(Base), Other)
+        self.assertIs(derived.get(Implementation), app.get(Implementation))
+
+    def test_pool(self):
+        closed = []
+
+        class Session:
+            def close(self):
+                closed.append(self)
+
+        class Service:
+            def __init__(self, sessions: Annotated[Session, Annotations(name="sessions")]):
+                self.sessions = sessions
+
+        def handle(s: Annotated[Session, Annotations(name="sessions")]):
+            return s
+
+        app = App(Provide(Provider(Session, name="sessions", pool=2), Service))
+        app.start()
+        pool = app.get(Service).sessions
+        self.assertIsInstance(pool, Pool)
+        self.assertIs(app.get("sessions"), pool)
+
+        session = app.call(handle)
+        self.assertIsInstance(session, Session)
+        self.assertIs(app.call(handle), session)
+
+        with pool.checkout() as first, pool.checkout() as second:
+            self.assertIsNot(first, second)
+            self.assertEqual(pool.stats()["busy"], 2)
+            with self.assertRaises(TimeoutError):
+                pool.acquire(timeout=0.01)
+        stats = app.pool_stats()["sessions"]
+        self.assertEqual((stats["created"], stats["idle"], stats["busy"], stats["waits"]), (2, 2, 0, 1))
+
+        app.stop()
+        self.assertEqual(len(closed), 2)
+        with self.assertRaises(PyDITypeError):
+            Provider(Session, pool=2, group=True)
+
+    def test_optional(self):
+        class Missing:
+            pass
+
+        def new_service(
+            a: Optional[Missing],
+            b: Missing | None,
+            c: Annotated[Missing, Annotations(optional=True)],
+            d: Annotated[TestClass1, Annotations("t1", optional=True)],
+            e: Missing = "default",
+            f: TestClass2 = None,
+        ) -> TestClass3:
+            service = TestClass3()
+            service.args = (a, b, c, d, e, f)
+            return service
+
+        app = App(Provide(Provider(TestClass1, "t1"), TestClass2, new_service), strict=True)
+        args = app.get(TestClass3).args
+        self.assertEqual(args[:3], (None, None, None))
+        self.assertIs(args[3], app.get("t1"))
+        self.assertEqual(args[4], "default")
+        self.assertIs(args[5], app.get(TestClass2))
+        self.assertEqual(app.call(new_service).args[4], "default")
+
+        # named string keys with a default
+        def new_named(t: "t1" = None, m: "missing" = "default") -> TestClass2:
+            named = TestClass2()
+            named.args = (t, m)
+            return named
+
+        app = App(Provide(Provider(TestClass1, "t1"), new_named), strict=True)
+        self.assertEqual(app.get(TestClass2).args, (app.get("t1"), "default"))
+
+        # generic hints with a default
+        def new_generic(
+            a: Optional[Dict[str, int]], b: list[int] = None, c: int | str = 1
+        ) -> Annotated[TestClass2, Annotations("generic")]:
+            generic = TestClass2()
+            generic.args = (a, b, c)
+            return generic
+
+        app = App(Provide(new_generic), strict=True)
+        self.assertEqual(app.get("generic").args, (None, None, 1))
+
+    def test_pool_build_failure(self):
+        second_started = threading.Event()
+        first_failed = threading.Event()
+        calls = []
+
+        def build():
+            calls.append(1)
+            if len(calls) == 1:
+                second_started.wait(5)
+                first_failed.set()
+                raise ValueError("first")
+            second_started.set()
+            first_failed.wait(5)
+            return TestClass1()
+
+        pool = Pool(build, 2)
+        errors = []
+        results = []
+
+        def acquire():
+            try:
+                results.append(pool.acquire())
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=acquire) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(pool.stats()["created"], 1)
+        pool.release(results[0])
+
+        # the place of the failed build can be used again
+        with pool.checkout() as first, pool.checkout() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(pool.stats()["created"], 2)
+
+    def test_missing_message(self):
+        def register(t: Annotated[TestClass1, Annotations("t3")]):
+            pass
+
+        app = App(Provide(Provider(TestClass1, "t1"), Provider(TestClass1, "t2"), TestClass2), Invoke(register))
+        with self.assertRaises(MissingDependencyError) as raised:
+            app.run()
+        message = str(raised.exception)
+        self.assertTrue(message.startswith("Cannot find dependency t3 for "))
+        self.assertIn(".register, did you mean ", message)
+        self.assertIn("t1", message)
+        self.assertIn("t2", message)
+        self.assertNotIn("TestClass2", message)
+
+    def test_transient_and_weak(self):
+        built = []
+
+        class Cache:
+            def __init__(self):
+                built.append(id(self))
+
+        def new_service(a: TestClass1, b: TestClass1, c: Cache) -> TestClass3:
+            return TestClass3()
+
+        app = App(Provide(
+            Provider(TestClass1, scope=TRANSIENT),
+            Provider(Cache, scope=WEAK),
+            new_service,
+        ))
+        self.assertIsNot(app.get(TestClass1), app.get(TestClass1))
+
+        cache = app.get(Cache)
+        self.assertIsInstance(app.get(TestClass3), TestClass3)
+        self.assertIs(app.get(Cache), cache)
+        self.assertEqual(len(built), 1)
+        del cache
+        gc.collect()
+        app.get(Cache)
+        self.assertEqual(len(built), 2)
+
+        with self.assertRaises(PyDITypeError):
+            Provider(TestClass1, scope="session")
+        with self.assertRaises(PyDITypeError):
+            Provider(TestClass1, group=True, scope=TRANSIENT)
+
+        def new_weak(l: Lifecycle) -> Annotated[TestClass2, Annotations(scope=WEAK)]:
+            return TestClass2()
+
+        with self.assertRaises(ScopeError):
+            App(Provide(new_weak)).get(TestClass2)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_fork_safe(self):
+        built = []
+
+        def new_connection(l: Lifecycle) -> Annotated[TestClass1, Annotations(fork_safe=False)]:
+            built.append(os.getpid())
+            l.append_hook(Hook(on_stop=lambda: None))
+            return TestClass1()
+
+        def new_service(c: TestClass1) -> TestClass3:
+            return TestClass3()
+
+        def register(l: Lifecycle, s: TestClass3, t: TestClass2):
+            l.append_hook(Hook(on_stop=lambda: None))
+
+        app = App(Provide(new_connection, new_service, TestClass2), Invoke(register))
+        app.start()
+        parent = (app.get(TestClass1), app.get(TestClass3), app.get(TestClass2))
+
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                result = [
+                    TestClass1 not in app.container,
+                    TestClass3 not in app.container,
+                    app.get(TestClass2) is parent[2],
+                    app.get(TestClass3) is not parent[1],
+                    app.get(TestClass1) is not parent[0],
+                    built == [os.getppid(), os.getpid()],
+                    # the hook of the parent connection is dropped, the one
+                    # of the connection built again is started
+                    len(app.started_hooks()) == 2,
+                ]
+                os.write(write, bytes(result))
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        with os.fdopen(read, "rb") as f:
+            self.assertEqual(list(f.read()), [1] * 7)
+
+        self.assertIs(app.get(TestClass1), parent[0])
+        self.assertEqual(len(app.started_hooks()), 2)
+        app.stop()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_fork_locks(self):
+        def new_pool() -> Annotated[TestClass1, Annotations(pool=1)]:
+            return TestClass1()
+
+        def new_member() -> Annotated[TestClass2, Annotations(group=True)]:
+            return TestClass2()
+
+        def new_service(t: Annotated[TestClass2, Annotations(group=True, lazy=True)]) -> TestClass3:
+            service = TestClass3()
+            service.members = t
+            return service
+
+        class Cache:
+            pass
+
+        def new_weak() -> Annotated[Cache, Annotations(scope=WEAK)]:
+            return Cache()
+
+        app = App(Provide(new_pool, new_member, new_service, new_weak))
+        members = app.get(TestClass3).members
+        app.get(Cache)
+        proxy = LazyProxy(TestClass1)
+        locks = [
+            app.hook_lock,
+            app.refresh_lock,
+            app.key_lock(TestClass1),
+            app.get(TestClass1).condition,
+            app.container[Cache].lock,
+            members._lock,
+            object.__getattribute__(proxy, "_lock"),
+        ]
+        # the locks are held by another thread of the parent while it forks
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            for lock in locks:
+                lock.acquire()
+            held.set()
+            release.wait(5)
+            for lock in reversed(locks):
+                lock.release()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait(5)
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # a lock inherited in a held state would block the child forever
+            signal.alarm(10)
+            try:
+                result = [
+                    app.hook_lock.acquire(timeout=1),
+                    app.refresh_lock.acquire(timeout=1),
+                    app.key_lock(TestClass1).acquire(timeout=1),
+                    app.get(TestClass1).acquire(timeout=1) is not None,
+                    isinstance(app.get(Cache), Cache),
+                    len(list(members)) == 1,
+                    isinstance(proxy, TestClass1),
+                ]
+                os.write(write, bytes(result))
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        release.set()
+        holder.join()
+        with os.fdopen(read, "rb") as f:
+            self.assertEqual(list(f.read()), [1] * 7)
+
+    def test_hooks_after_start(self):
+        events = []
+
+        def new_heavy(l: Lifecycle) -> Annotated[TestClass1, Annotations(lazy=True)]:
+            l.append_hook(Hook(on_start=lambda: events.append("start 1"), on_stop=lambda: events.append("stop 1")))
+            return TestClass1()
+
+        def new_member(l: Lifecycle) -> Annotated[TestClass2, Annotations(group=True)]:
+            l.append_hook(Hook(on_start=lambda: events.append("start 2"), on_stop=lambda: events.append("stop 2")))
+            return TestClass2()
+
+        def new_service(l: Lifecycle) -> TestClass3:
+            l.append_hook(Hook(on_start=lambda: events.append("start 3"), on_stop=lambda: events.append("stop 3")))
+            return TestClass3()
+
+        def register(t: Annotated[TestClass1, Annotations(lazy=True)], g: Annotated[TestClass2, Annotations(group=True, lazy=True)]):
+            held.extend([t, g])
+
+        def use(s: TestClass3) -> TestClass3:
+            return s
+
+        held = []
+        app = App(Provide(new_heavy, new_member, new_service), Invoke(register))
+        app.start()
+        self.assertEqual(events, [])
+        # built through a lazy proxy, a lazy group and call, after start
+        self.assertIsInstance(held[0], TestClass1)
+        self.assertIsInstance(held[1][0], TestClass2)
+        self.assertIsInstance(app.call(use), TestClass3)
+        self.assertEqual(events, ["start 1", "start 2", "start 3"])
+        app.stop()
+        self.assertEqual(events[3:], ["stop 3", "stop 2", "stop 1"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,164 @@
+import asyncio
+import time
+import unittest
+from typing import Annotated
+
+from src.dinjections import *
+
+
+class Dependency1:
+    pass
+
+
+class Dependency2:
+    def __init__(self, p: Annotated[Dependency1, Annotations("t1")], p2: Annotated[Dependency1, Annotations("t2")]):
+        self.p = p
+        self.p2 = p2
+
+
+def new_slow(name):
+    async def new_dependency_1() -> Annotated[Dependency1, Annotations(name=name)]:
+        await asyncio.sleep(0.2)
+        return Dependency1()
+    return new_dependency_1
+
+
+class TestAsyncApp(unittest.IsolatedAsyncioTestCase):
+    async def test_run(self):
+        events = []
+
+        async def register_hooks(l: Lifecycle, t: Dependency2):
+            self.assertIsInstance(t.p, Dependency1)
+            self.assertIsInstance(t.p2, Dependency1)
+
+            async def on_start():
+                await asyncio.sleep(0.2)
+                events.append("start")
+
+            for _ in range(2):
+                l.append_hook(Hook(on_start=on_start, on_stop=lambda: events.append("stop")))
+
+        app = AsyncApp(
+            Provide(new_slow("t1"), new_slow("t2"), Dependency2),
+            Invoke(register_hooks),
+        )
+        start = time.perf_counter()
+        await app.run()
+        # providers and hooks are awaited concurrently
+        self.assertLess(time.perf_counter() - start, 0.7)
+        self.assertEqual(sorted(events), ["start", "start", "stop", "stop"])
+
+    async def test_group(self):
+        result = []
+
+        def register(t: Annotated[Dependency1, Annotations(group=True)]):
+            result.extend(t)
+
+        async def new_dependency_1() -> Annotated[Dependency1, Annotations(group=True)]:
+            return Dependency1()
+
+        app = AsyncApp(
+            Provide(
+                new_dependency_1,
+                Provider(Dependency1, group=True),
+            ),
+            Invoke(register),
+        )
+        await app.run()
+        self.assertEqual(len(result), 2)
+
+    async def test_start_order(self):
+        events = []
+
+        def hooks(name, delay):
+            async def on_start():
+                await asyncio.sleep(delay)
+                events.append(name)
+            return Hook(on_start=on_start, on_stop=lambda: events.append("stop " + name))
+
+        def new_dependency_1(l: Lifecycle) -> Dependency1:
+            l.append_hook(hooks("d1", 0.1))
+            return Dependency1()
+
+        def new_dependency_2(l: Lifecycle, d: Dependency1) -> Dependency2:
+            l.append_hook(hooks("d2", 0.05))
+            return Dependency2(d, d)
+
+        def register(l: Lifecycle, d: Dependency2):
+            l.append_hook(hooks("invoke", 0))
+
+        app = AsyncApp(Provide(new_dependency_1, new_dependency_2), Invoke(register))
+        await app.run()
+        # hooks start after the hooks of their dependencies, and stop before them
+        self.assertEqual(events, ["d1", "d2", "invoke", "stop invoke", "stop d2", "stop d1"])
+
+    async def test_warmup(self):
+        async def new_dependency_1() -> Dependency1:
+            await asyncio.sleep(0.05)
+            return Dependency1()
+
+        app = AsyncApp(Provide(new_dependency_1))
+        await app.start(warmup="background")
+        await asyncio.wait_for(asyncio.to_thread(app.ready.wait), 1)
+        self.assertIsInstance(app.container[Dependency1], Dependency1)
+        await app.stop()
+
+        app = AsyncApp(Provide(new_dependency_1))
+        await app.start()
+        self.assertTrue(app.ready.is_set())
+        self.assertNotIn(Dependency1, app.container)
+        await app.stop()
+
+    async def test_get_async(self):
+        events = []
+
+        async def new_dependency_1(l: Lifecycle) -> Dependency1:
+            await asyncio.sleep(0)
+            l.append_hook(Hook(on_start=lambda: events.append("start"), on_stop=lambda: events.append("stop")))
+            return Dependency1()
+
+        def use(d: Dependency1) -> Dependency1:
+            return d
+
+        app = AsyncApp(Provide(new_dependency_1), listeners=[Recorder()])
+        await app.start()
+        # get and call cannot await the provider
+        with self.assertRaises(PyDITypeError):
+            app.get(Dependency1)
+        with self.assertRaises(PyDITypeError):
+            app.call(use)
+        self.assertNotIn(Dependency1, app.container)
+
+        dependency = await app.get_async(Dependency1)
+        self.assertIsInstance(dependency, Dependency1)
+        self.assertIs(app.get(Dependency1), dependency)
+        self.assertIs(app.call(use), dependency)
+        self.assertEqual(events, ["start"])
+        self.assertIsNone(app.stats()["providers"]["Dependency1"]["invoke"])
+        await app.stop()
+        self.assertEqual(events, ["start", "stop"])
+
+    def test_coroutine_providers(self):
+        async def new_dependency_1() -> Dependency1:
+            return Dependency1()
+
+        for provider in (
+            Provider(new_dependency_1, name=Dependency1, lazy=True),
+            Provider(new_dependency_1, name=Dependency1, scope=TRANSIENT),
+            Provider(new_dependency_1, name=Dependency1, scope=REQUEST),
+            Provider(new_dependency_1, name=Dependency1, pool=2),
+        ):
+            with self.assertRaises(PyDITypeError):
+                AsyncApp(Provide(provider))
+
+        def register(d: Annotated[Dependency1, Annotations(lazy=True)]):
+            pass
+
+        with self.assertRaises(PyDITypeError):
+            AsyncApp(Provide(new_dependency_1), Invoke(register))
+        # the same providers are fine when they are not coroutine functions
+        AsyncApp(Provide(Provider(Dependency1, lazy=True)), Invoke(register))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from typing import Annotated
+
+from src.dinjections import *
+from src.dinjections.codegen import generate, main
+
+
+class Config:
+    pass
+
+
+class Database:
+    def __init__(self, config: Config, l: Lifecycle):
+        self.config = config
+        l.append_hook(Hook(on_start=lambda: None))
+
+
+class Plugin:
+    pass
+
+
+def new_plugin(d: Database) -> Annotated[Plugin, Annotations(name="plugins", group=True)]:
+    return Plugin()
+
+
+invoked = []
+
+
+def register(d: Database, p: Annotated[Plugin, Annotations(name="plugins", group=True)]):
+    invoked.append((d, p))
+
+
+def new_app() -> App:
+    return App(
+        Provide(Config, Database, new_plugin, new_plugin, Provider(Plugin, name="unused")),
+        Invoke(register),
+    )
+
+
+class TestCodegen(unittest.TestCase):
+    def test_generate(self):
+        code = generate(new_app(), f"{__name__}:new_app", "wired.py")
+        self.assertNotIn("dinjections.options", code)
+        self.assertIn(f"{__name__}:new_app --output wired.py to generate it again", code)
+
+        namespace = {}
+        exec(compile(code, "wired.py", "exec"), namespace)
+        invoked.clear()
+        container, lifecycle = namespace["build"]()
+
+        self.assertEqual(set(container), {Config, Database, "plugins"})
+        self.assertIs(container[Database].config, container[Config])
+        self.assertEqual(len(container["plugins"]), 2)
+        self.assertEqual(invoked, [(container[Database], container["plugins"])])
+        self.assertEqual(len(lifecycle.hooks), 1)
+
+    def test_check(self):
+        source = f"{__name__}:new_app"
+        with tempfile.TemporaryDirectory() as path:
+            output = os.path.join(path, "wired.py")
+            self.assertEqual(main([source, "--output", output, "--check"]), 1)
+            self.assertEqual(main([source, "--output", output]), 0)
+            self.assertEqual(main([source, "--output", output, "--check"]), 0)
+
+            with open(output, "a") as f:
+                f.write("# edited\n")
+            self.assertEqual(main([source, "--output", output, "--check"]), 1)
+
+    def test_unsupported(self):
+        app = App(Provide(Provider(Config, lazy=True)), Invoke(register_lazy))
+        with self.assertRaises(PyDITypeError):
+            generate(app, "app")
+
+
+def register_lazy(c: Config):
+    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from typing import Annotated
+
+from src.dinjections import *
+
+
+built = []
+
+
+class Heavy:
+    def __init__(self):
+        time.sleep(0.01)
+        built.append(self)
+
+    def run(self):
+        return "run"
+
+
+class TestClass1:
+    pass
+
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        built.clear()
+
+    def test_lazy_provider(self):
+        result = []
+
+        def register(h: Heavy):
+            result.append(h)
+
+        app = App(Provide(Provider(Heavy, lazy=True)), Invoke(register))
+        app.run()
+        self.assertEqual(built, [])
+        self.assertIsInstance(result[0], LazyProxy)
+
+        threads = [threading.Thread(target=result[0].run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertEqual(result[0].run(), "run")
+        self.assertIsInstance(result[0], Heavy)
+        self.assertIs(app.container[Heavy], built[0])
+
+    def test_lazy_annotation(self):
+        result = []
+
+        def register(h: Annotated[Heavy, Annotations(lazy=True)], t: TestClass1):
+            result.append(h)
+
+        app = App(Provide(Heavy, TestClass1), Invoke(register))
+        app.run()
+        self.assertEqual(built, [])
+        self.assertEqual(result[0].run(), "run")
+        self.assertEqual(len(built), 1)
+
+    def test_built_dependency_is_not_proxied(self):
+        result = []
+
+        def register(h: Heavy, h2: Annotated[Heavy, Annotations(lazy=True)]):
+            result.extend([h, h2])
+
+        app = App(Provide(Heavy), Invoke(register))
+        app.run()
+        self.assertIs(result[0], result[1])
+
+    def test_lazy_breaks_cycle(self):
+        class Node1:
+            def __init__(self, n: Annotated["Node2", Annotations(name="n2", lazy=True)]):
+                self.n = n
+
+        class Node2:
+            def __init__(self, n: Node1):
+                self.n = n
+
+        result = []
+
+        def register(n: Node1):
+            result.append(n)
+
+        app = App(Provide(Node1, Provider(Node2, name="n2")), Invoke(register))
+        app.run()
+        self.assertIs(result[0].n.n, result[0])
+
+    def test_lazy_group(self):
+        result = []
+
+        def register(g: Annotated[Heavy, Annotations(group=True, lazy=True)]):
+            for h in g:
+                result.append(h)
+                break
+
+        app = App(
+            Provide(*[Provider(Heavy, group=True) for _ in range(5)]),
+            Invoke(register),
+        )
+        app.run()
+        self.assertEqual(len(built), 1)
+        group = app.container[Heavy]
+        self.assertIsInstance(group, LazyGroup)
+        self.assertIs(group[0], result[0])
+        self.assertEqual(len(list(group)), 5)
+        self.assertEqual(len(built), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
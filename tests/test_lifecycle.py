@@ -0,0 +1,107 @@
+import time
+import unittest
+
+from src.dinjections import *
+
+
+class Dependency1:
+    def __init__(self, l: Lifecycle):
+        l.append_hook(Hook(
+            on_start=lambda: events.append("start 1"),
+            on_stop=lambda: events.append("stop 1"),
+        ))
+
+
+class Dependency2:
+    def __init__(self, t: Dependency1, l: Lifecycle):
+        l.append_hook(Hook(
+            on_start=lambda: events.append("start 2"),
+            on_stop=lambda: events.append("stop 2"),
+        ))
+
+
+events = []
+
+
+def register_hooks(l: Lifecycle, t: Dependency2):
+    l.append_hook(Hook(
+        on_start=lambda: events.append("start invoke"),
+        on_stop=lambda: events.append("stop invoke"),
+    ))
+
+
+def sleeper(name, seconds):
+    class Sleeper:
+        def __init__(self, l: Lifecycle):
+            l.append_hook(Hook(on_stop=lambda: time.sleep(seconds)))
+    return Provider(Sleeper, name=name)
+
+
+def register_sleepers(a: Annotated[object, Annotations("a")], b: Annotated[object, Annotations("b")]):
+    pass
+
+
+class TestLifecycle(unittest.TestCase):
+    def setUp(self):
+        events.clear()
+
+    def test_start_stop(self):
+        app = App(Provide(Dependency1, Dependency2), Invoke(register_hooks))
+        app.start()
+        self.assertEqual(events, ["start 1", "start 2", "start invoke"])
+        app.stop()
+        self.assertEqual(events[3:], ["stop invoke", "stop 2", "stop 1"])
+
+        # stopped hooks are not stopped again
+        app.stop()
+        self.assertEqual(len(events), 6)
+
+    def test_run(self):
+        app = App(Provide(Dependency1, Dependency2), Invoke(register_hooks))
+        app.run()
+        self.assertEqual(events, [
+            "start 1", "start 2", "start invoke", "stop invoke", "stop 2", "stop 1",
+        ])
+
+    def test_stop_layer_concurrently(self):
+        app = App(Provide(sleeper("a", 0.2), sleeper("b", 0.2)), Invoke(register_sleepers))
+        app.start()
+        start = time.perf_counter()
+        app.stop(timeout=1)
+        self.assertLess(time.perf_counter() - start, 0.35)
+
+    def test_stop_timeout(self):
+        app = App(Provide(sleeper("a", 1), sleeper("b", 0)), Invoke(register_sleepers))
+        app.start()
+        start = time.perf_counter()
+        with self.assertRaises(LifecycleError) as ctx:
+            app.stop(hook_timeout=0.1)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(len(ctx.exception.errors), 1)
+        self.assertIsInstance(ctx.exception.errors[0], TimeoutError)
+
+    def test_start_error(self):
+        def register_failing(l: Lifecycle, t: Dependency2):
+            def fail():
+                raise ValueError("start")
+            l.append_hook(Hook(on_start=fail, on_stop=lambda: events.append("stop invoke")))
+
+        app = App(Provide(Dependency1, Dependency2), Invoke(register_failing))
+        with self.assertRaises(ValueError):
+            app.start()
+        self.assertEqual(events, ["start 1", "start 2", "stop 2", "stop 1"])
+
+
+class TestAsyncLifecycle(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        events.clear()
+
+    async def test_run(self):
+        app = AsyncApp(Provide(Dependency1, Dependency2), Invoke(register_hooks))
+        await app.run()
+        self.assertEqual(sorted(events[:3]), ["start 1", "start 2", "start invoke"])
+        self.assertEqual(events[3:], ["stop invoke", "stop 2", "stop 1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from src.dinjections import *
+
+
+class TestClass1:
+    pass
+
+
+def reimported(cls):
+    # builds a distinct class object with the same name and source file,
+    # as happens when a module is imported through two different paths
+    return type(cls.__name__, cls.__bases__, {"__module__": cls.__module__, "__qualname__": cls.__qualname__})
+
+
+class TestRegistry(unittest.TestCase):
+    def test_identity_lookup(self):
+        registry = Registry()
+        registry[TestClass1] = "t1"
+        registry["t2"] = "t2"
+
+        other = reimported(TestClass1)
+        self.assertIsNot(other, TestClass1)
+        self.assertIn(other, registry)
+        self.assertEqual(registry[other], "t1")
+        self.assertEqual(key_in(other, registry), "t1")
+        self.assertEqual(key_in("t2", registry), "t2")
+        self.assertIsNone(key_in("t3", registry))
+
+    def test_identity_override(self):
+        registry = Registry({TestClass1: "t1"})
+        other = reimported(TestClass1)
+        registry[other] = "t2"
+
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry[TestClass1], "t2")
+
+    def test_merge(self):
+        registry = Registry({TestClass1: "t1"}) | {"t2": "t2"}
+
+        self.assertIsInstance(registry, Registry)
+        self.assertEqual(registry.get(reimported(TestClass1)), "t1")
+        self.assertEqual(registry.pop("t2"), "t2")
+        self.assertNotIn("t2", registry)
+
+    def test_merge_in_place(self):
+        registry = Registry({TestClass1: "t1", "group": ["m1"]})
+        registry.merge({reimported(TestClass1): "t2", "group": ["m2"]})
+        registry.merge({"group": ["m3"], "t3": "t3"})
+
+        self.assertEqual(len(registry), 3)
+        self.assertEqual(registry[TestClass1], "t2")
+        self.assertEqual(registry["group"], ["m1", "m2", "m3"])
+
+        registry.merge({"group": "single"})
+        self.assertEqual(registry["group"], "single")
+
+    def test_invalid_key(self):
+        with self.assertRaises(PyDITypeError):
+            key_in(1, Registry())
+
+
+if __name__ == "__main__":
+    unittest.main()
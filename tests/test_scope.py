@@ -0,0 +1,93 @@
+import unittest
+from typing import Annotated
+
+from src.dinjections import *
+
+
+class TestClass1:
+    pass
+
+
+class Request:
+    pass
+
+
+class TestClass2:
+    pass
+
+
+class Context:
+    def __init__(self, request: Request, t: TestClass1, l: Lifecycle):
+        self.request = request
+        self.t = t
+        self.closed = False
+        l.append_hook(Hook(on_stop=self.close))
+
+    def close(self):
+        self.closed = True
+
+
+def new_test_class_2(c: Context) -> TestClass2:
+    return TestClass2()
+
+
+class TestScope(unittest.TestCase):
+    def setUp(self):
+        self.app = App(
+            Provide(
+                TestClass1,
+                Provider(Request, scope=REQUEST),
+                Provider(Context, scope=REQUEST),
+            ),
+        )
+
+    def test_scope(self):
+        request = Request()
+        with self.app.scope({Request: request}) as scope:
+            context = scope.get(Context)
+            self.assertIs(context.request, request)
+            self.assertIs(scope.get(Context), context)
+            self.assertIs(context.t, self.app.container[TestClass1])
+            self.assertNotIn(Context, self.app.container)
+        self.assertTrue(context.closed)
+
+        with self.app.scope() as scope:
+            other = scope.get(Context)
+            self.assertIsNot(other, context)
+            self.assertIsNot(other.request, request)
+            self.assertIs(other.t, context.t)
+
+    def test_singleton_with_request_dependency(self):
+        app = App(
+            Provide(
+                TestClass1,
+                Provider(Request, scope=REQUEST),
+                Provider(Context, scope=REQUEST),
+                new_test_class_2,
+            ),
+        )
+        with self.assertRaises(ScopeError):
+            app.scope().get(TestClass2)
+
+    def test_invoke_with_request_dependency(self):
+        def register(c: Context):
+            pass
+
+        app = App(
+            Provide(
+                TestClass1,
+                Provider(Request, scope=REQUEST),
+                Provider(Context, scope=REQUEST),
+            ),
+            Invoke(register),
+        )
+        with self.assertRaises(ScopeError):
+            app.run()
+
+    def test_missing_dependency(self):
+        with self.assertRaises(MissingDependencyError):
+            self.app.scope().get(TestClass2)
+
+
+if __name__ == "__main__":
+    unittest.main()